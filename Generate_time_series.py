@@ -1,7 +1,7 @@
 import pandas as pd
 import itertools
 import os
-from TumorSimV8 import Environment, Tumor, Cell, Cancer_Cell
+from TumorSimV8 import ArrayEnvironment, Tumor, HistoryObserver, Cell, Cancer_Cell
 
 # Parameters
 mutation_rates = [0.01, 0.015, 0.02]
@@ -16,9 +16,10 @@ os.makedirs("timeseries_output", exist_ok=True)
 for m_rate, p_chance in itertools.product(mutation_rates, proliferation_chances):
     print(f"Running: mutation_rate={m_rate}, proliferation_chance={p_chance}")
     
-    env = Environment(width=grid_size, height=grid_size)
+    env = ArrayEnvironment(width=grid_size, height=grid_size)
     env.initialize_grid()
     tumor = Tumor(env)
+    tumor.add_observer(HistoryObserver())
     
     # Seed the tumor with a custom Cancer_Cell
     tumor.seed_initial_cancer(
@@ -1,7 +1,7 @@
 import csv
 import random
 import numpy as np
-from TumorSimV8 import Environment, Tumor, Cancer_Cell
+from TumorSimV8 import ArrayEnvironment, Tumor, Cancer_Cell
 
 # --- Sweep settings ---
 mutation_rates = [0.005,0.01,0.02]
@@ -26,7 +26,7 @@ with open("parameter_sweep_results.csv", mode="w", newline="") as file:
                 random.seed(42 + i + int(m_rate * 1000) + int(p_chance * 1000))
                 np.random.seed(42 + i + int(m_rate * 1000) + int(p_chance * 1000))
 
-                env = Environment(WIDTH, HEIGHT)
+                env = ArrayEnvironment(WIDTH, HEIGHT)
                 env.initialize_grid()
 
                 tumor = Tumor(env)
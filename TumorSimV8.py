@@ -1,5 +1,12 @@
 import random
 import json
+import weakref
+import functools
+import itertools
+import heapq
+import os
+import multiprocessing
+from multiprocessing import shared_memory
 from turtle import position
 import matplotlib
 matplotlib.use('Agg')  # Use a backend suitable for scripts (no GUI)
@@ -44,6 +51,25 @@ MUTATION_TYPES = [
     "IDH1",     # ↓ aggressiveness slightly (metabolic shift)
 ]
 
+# bit of each mutation in a genotype bitmask
+MUTATION_BITS = {name: 1 << i for i, name in enumerate(MUTATION_TYPES)}
+ALL_MUTATIONS_MASK = (1 << len(MUTATION_TYPES)) - 1
+
+# number of set bits in each entry of an array of genotype bitmasks
+def popcount(masks):
+    masks = np.asarray(masks, dtype=np.uint32)
+    masks = masks - ((masks >> 1) & 0x55555555)
+    masks = (masks & 0x33333333) + ((masks >> 2) & 0x33333333)
+    masks = (masks + (masks >> 4)) & 0x0F0F0F0F
+    return (masks * 0x01010101) >> 24
+
+# picks one of the bits not set in mask uniformly at random
+def random_unset_bit(mask):
+    free = ALL_MUTATIONS_MASK & ~mask
+    for _ in range(random.randrange(bin(free).count("1"))):
+        free &= free - 1 # drop the lowest set bit
+    return free & -free
+
 MUTATION_EFFECTS = {
     "TP53":   {"proliferation_chance": +0.04},
     "KRAS":   {"proliferation_chance": +0.03},
@@ -64,6 +90,165 @@ MUTATION_EFFECTS = {
     "CDKN2A": {"proliferation_chance": +0.03},
 }
 
+# (proliferation_chance, mutation_rate, resistance, aggressiveness, pressure_sensitivity) change per mutation, rows follow MUTATION_TYPES
+TRAIT_COLUMNS = ('proliferation_chance', 'mutation_rate', 'resistance', 'aggressiveness', 'pressure_sensitivity')
+TRAIT_INDEX = {trait: i for i, trait in enumerate(TRAIT_COLUMNS)}
+MUTATION_EFFECT_TABLE = np.array([[MUTATION_EFFECTS[name].get(trait, 0.0) for trait in TRAIT_COLUMNS] for name in MUTATION_TYPES])
+
+# Effects are additive, so a cell's traits are its founder traits plus a delta that only depends on its genotype.
+# The table holds that delta for all 2^17 genotypes (5 MB) and is built the first time it is needed.
+_genotype_trait_table = None
+
+def genotype_trait_table():
+    global _genotype_trait_table
+    if _genotype_trait_table is None:
+        table = np.zeros((1 << len(MUTATION_TYPES), len(TRAIT_COLUMNS)))
+        for bit, effect in enumerate(MUTATION_EFFECT_TABLE):
+            low = 1 << bit
+            table[low:2 * low] = table[:low] + effect # genotypes whose highest mutation is this one
+        _genotype_trait_table = table
+    return _genotype_trait_table
+
+# A genotype id packs the index of the cell's founder traits and its mutation bitmask: founder << GENOTYPE_SHIFT | mask
+GENOTYPE_SHIFT = len(MUTATION_TYPES)
+
+# Flyweight for the genotypes of a CellStore: most cells share one of a few genotypes (founder traits plus mutations),
+# so each distinct set of founder traits is stored once and cells only keep a genotype id (see GENOTYPE_SHIFT). Every
+# genotype a lineage can reach by mutating has an id up front, a mutation only sets a bit of it and never registers
+# anything (the parallel workers mutate with a read-only copy). counts keeps the number of cells per genotype, the
+# clone sizes
+class GenotypeRegistry():
+    def __init__(self, founders=None):
+        self.founders = np.zeros((0, len(TRAIT_COLUMNS))) if founders is None else founders # rows follow TRAIT_COLUMNS
+        self.founder_index = {tuple(founder): i for i, founder in enumerate(self.founders.tolist())}
+        self.counts = {} # genotype id -> number of cells, genotypes without cells are left out
+
+    # id of the genotype with founder traits founder and mutation bitmask mask, registering the founder if it is new
+    def genotype(self, founder, mask=0):
+        key = tuple(float(value) for value in founder)
+        index = self.founder_index.get(key)
+        if index is None:
+            index = len(self.founders)
+            if index >= 1 << (31 - GENOTYPE_SHIFT):
+                raise ValueError("too many distinct founder traits for 32-bit genotype ids")
+            self.founders = np.vstack((self.founders, [key]))
+            self.founder_index[key] = index
+        return index << GENOTYPE_SHIFT | mask
+
+    # change cells of genotype were added (or removed when negative)
+    def add(self, genotype, change):
+        count = self.counts.get(genotype, 0) + change
+        if count:
+            self.counts[genotype] = count
+        else:
+            del self.counts[genotype]
+
+    # add for an array of genotypes, one cell each
+    def count(self, genotypes, change):
+        distinct, counts = np.unique(genotypes, return_counts=True)
+        for genotype, count in zip(distinct.tolist(), counts.tolist()):
+            self.add(genotype, change * count)
+
+    # (genotype ids, cell counts) of the genotypes that have cells, largest clone first
+    def clone_sizes(self):
+        genotypes = np.fromiter(self.counts.keys(), dtype=np.int64, count=len(self.counts))
+        counts = np.fromiter(self.counts.values(), dtype=np.int64, count=len(self.counts))
+        order = np.lexsort((genotypes, -counts))
+        return genotypes[order], counts[order]
+
+    # founder traits (by name) and mutation names of a genotype id
+    def describe(self, genotype):
+        founder = dict(zip(TRAIT_COLUMNS, self.founders[genotype >> GENOTYPE_SHIFT].tolist()))
+        return founder, frozenset(name for name in MUTATION_TYPES if genotype & MUTATION_BITS[name])
+
+# global tumor fraction at which division stops completely
+CARRYING_CAPACITY = 0.3
+
+# chance to divide this step for a cell with these traits under local pressure (see Cancer_Cell.should_divide)
+def division_chance(proliferation_chance, pressure_sensitivity, pressure, global_tumor_fraction):
+    local_effect = 1 - pressure * pressure_sensitivity
+    global_effect = max(0.0, 1 - (global_tumor_fraction / CARRYING_CAPACITY))
+    effective_chance = proliferation_chance * local_effect * global_effect
+    return max(0.0, min(1.0, effective_chance))
+
+# Counter-based random streams. A draw is a hash of (seed, step, cell, purpose, index), so it does not depend on
+# how many draws were made before it or in which order cells are visited. Cells are identified by their site
+# (see site_key): cells never move, and rows depend on the order daughters were appended in.
+# purpose tells apart the decisions a cell makes in one step, index the options within one decision.
+DRAW_ORDER, DRAW_MUTATION, DRAW_GENE, DRAW_DIVISION, DRAW_GAP, DRAW_SITE, DRAW_PRIORITY, DRAW_WAIT = range(8)
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+# splitmix64 finalizer on a python int
+def _mix64(z):
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+# _mix64 on a uint64 array
+def _mix64_array(z):
+    with np.errstate(over='ignore'):
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def _step_key(seed, step):
+    return _mix64((seed * _GOLDEN_GAMMA + step) & _MASK64)
+
+# the cell part of a draw's counter: its (x, y) site packed into 64 bits, 21 bits per coordinate for (x, y, z)
+def site_key(x, y, z=None):
+    if z is None:
+        return ((x & 0xFFFFFFFF) << 32) | (y & 0xFFFFFFFF)
+    return ((x & 0x1FFFFF) << 42) | ((y & 0x1FFFFF) << 21) | (z & 0x1FFFFF)
+
+# site_key for an (n, 2) or (n, 3) array of positions
+def site_keys(positions):
+    positions = np.asarray(positions).astype(np.int64)
+    if positions.shape[-1] == 3:
+        positions = (positions & 0x1FFFFF).astype(np.uint64)
+        return (positions[..., 0] << np.uint64(42)) | (positions[..., 1] << np.uint64(21)) | positions[..., 2]
+    positions = positions & 0xFFFFFFFF
+    return (positions[..., 0].astype(np.uint64) << np.uint64(32)) | positions[..., 1].astype(np.uint64)
+
+# uniform draw in [0, 1) for one counter
+def counter_uniform(seed, step, cell, purpose, index=0):
+    h = _mix64(_step_key(seed, step) ^ cell)
+    h = _mix64(h ^ ((purpose << 32) | index))
+    return (h >> 11) * 2.0 ** -53
+
+# counter_uniform for arrays of cell keys and indices (broadcast against each other), bit-for-bit the same values
+def counter_uniforms(seed, step, cells, purpose, index=0):
+    h = _mix64_array(np.uint64(_step_key(seed, step)) ^ np.asarray(cells, dtype=np.uint64))
+    h = _mix64_array(h ^ (np.uint64(purpose << 32) | np.asarray(index, dtype=np.uint64)))
+    return (h >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+# Subtype labels for a trait vector (ordered like TRAIT_COLUMNS), strongest deviation from the default cell first.
+# Memoized, so every cell with the same traits shares one tuple.
+@functools.lru_cache(maxsize=None)
+def classify_subtypes(traits):
+    proliferation_chance, mutation_rate, resistance, aggressiveness, pressure_sensitivity = traits
+    effects = [
+        ("Proliferative", proliferation_chance - 0.3),
+        ("Mutator", mutation_rate - 0.01),
+        ("Resistant", resistance),
+        ("Aggressive", aggressiveness - 1.2),
+        ("Insensitive", 1.0 - pressure_sensitivity), # lower sensitivity = more insensitive
+    ]
+    threshold = 0.01
+    # stable sort, equal effects keep the order above
+    names = tuple(name for name, value in sorted(effects, key=lambda effect: -effect[1]) if value > threshold)
+    return names or ("Unclassified",)
+
+# SUBTYPE_COLORS index of the leading subtype of every row of a traits array, classifying each distinct
+# trait vector once
+def subtype_color_indices(traits):
+    if len(traits) == 0:
+        return np.zeros(0, dtype=int)
+    distinct, inverse = np.unique(traits, axis=0, return_inverse=True)
+    colors = np.array([SUBTYPE_COLORS[classify_subtypes(tuple(row))[0]] for row in distinct.tolist()])
+    return colors[inverse.ravel()]
+
 # Define color mapping and priority for subtypes
 
 SUBTYPE_COLORS = {
@@ -85,7 +270,31 @@ custom_cmap = ListedColormap([
     "#999999",  # 6: Unclassified = gray
 ])
 
+# (x, y) offsets of the 8 neighbors of a site. This is the one neighbor ordering of the simulation: get_neighbors
+# lists neighbors in it, divide_cell scans it for an empty site and the counter streams number the site options of a
+# division by it
+NEIGHBOR_OFFSETS = np.array([
+    (-1, 0), (-1, 1), (0, 1), (1, 1),
+    (1, 0), (1, -1), (0, -1), (-1, -1)
+])
+
+# (x, y, z) offsets of the 26 neighbors of a site in a 3D lattice (see ArrayEnvironment3D)
+NEIGHBOR_OFFSETS_3D = np.array([offset for offset in itertools.product((-1, 0, 1), repeat=3) if any(offset)])
+
+# occupancy of the sentinel border around the ArrayEnvironment grids (0 is empty, 1 a cancer cell)
+OFF_GRID = 255
+
+# site moved by offset, as a tuple. Built from a list: a generator expression would allocate a frame on every call,
+# and the per-cell engines do this for every neighbor they look at
+def offset_site(site, offset):
+    return tuple([coordinate + step for coordinate, step in zip(site, offset)])
+
 class Environment():
+    # neighbor offsets in site order, see NEIGHBOR_OFFSETS
+    neighbor_offsets = NEIGHBOR_OFFSETS
+    _neighbor_offsets = NEIGHBOR_OFFSETS.tolist() # as python lists for the per-cell scans
+    _neighborhood_offsets = _neighbor_offsets + [[0, 0]] # the neighbors, then the site itself
+
     def __init__(self, width, height):
         self.width = width
         self.height = height
@@ -101,6 +310,17 @@ class Environment():
             self.grid.append(row)
     #cell = self.grid[y][x]  grid can be accessed like this
 
+    # number of sites the tumor can fill, the carrying capacity is a fraction of it
+    def site_count(self):
+        return self.width * self.height
+
+    # where seed_initial_cancer puts the first cell
+    def center(self):
+        return self.width // 2, self.height // 2
+
+    def get_cell(self, x, y):
+        return self.grid[y][x]
+
     #returns bool depending on if pos is within grid
     def is_valid_position(self,x,y):
         if 0 <= x < self.width and 0 <= y < self.height:
@@ -120,40 +340,130 @@ class Environment():
             return True
         return False
 
+    # place_cell for row of store (a division), this grid holds cell objects so the row gets its view
+    def place_row(self, store, row, *site):
+        return self.place_cell(store.view(row), *site)
+
     #returns list of neighboring cells (8 directions unless on border), this is useful for determining if crowding is occuring and if the tumor can grow further
     def get_neighbors(self,x,y):
-        directions = [ # rotate around the cell starting from above and going clockwise
-            (-1,0), #north
-            (-1,+1),
-            (0,+1), #east
-            (+1,+1),
-            (+1,0), #south
-            (+1,-1),
-            (0,-1), #west
-            (-1,-1)
-            ]
         neighbors = []
 
-        for direction_row, direction_col in directions:
-            coordinate_row = y + direction_row
-            coordinate_col = x + direction_col
+        for offset_x, offset_y in self._neighbor_offsets:
+            coordinate_row = y + offset_y
+            coordinate_col = x + offset_x
 
             if 0 <= coordinate_col < self.width and 0 <= coordinate_row < self.height:
                 neighbors.append(self.grid[coordinate_row][coordinate_col])
 
         return neighbors
 
-    #plot tumor using ascii/plt
-    def visualize(self):
-        grid_data = np.zeros((self.height, self.width), dtype=int)
+    # indices in neighbor_offsets of the empty neighbors of site, in neighbor_offsets order. With best_gaps only the
+    # ones with the most cancer neighbors (the gaps divide_cell prefers). Use the list right away, backends may reuse it
+    def free_directions(self, site, best_gaps=False):
+        directions = []
+        best = 0
+        for direction, offset in enumerate(self._neighbor_offsets):
+            neighbor = offset_site(site, offset)
+            if not self.is_valid_position(*neighbor) or self.is_occupied(*neighbor):
+                continue
+            if best_gaps:
+                gap = self.cancer_neighbor_count(*neighbor)
+                if gap < best:
+                    continue
+                if gap > best:
+                    best = gap
+                    directions.clear()
+            directions.append(direction)
+        return directions
+
+    # the neighbor of site in direction (an index in neighbor_offsets)
+    def neighbor_site(self, site, direction):
+        return offset_site(site, self._neighbor_offsets[direction])
+
+    # rows of store's cells at and around site that still have an empty neighbor and rows of the ones that do not,
+    # the only cells whose place in Tumor.frontier can change when site fills up
+    def frontier_changes(self, site, store):
+        open_rows, saturated_rows = [], []
+        for offset in self._neighborhood_offsets:
+            neighbor = offset_site(site, offset)
+            if not self.is_valid_position(*neighbor):
+                continue
+            cell = self.get_cell(*neighbor)
+            if cell.cell_type != 'cancer' or cell._store is not store:
+                continue
+            if self.is_saturated(*neighbor):
+                saturated_rows.append(cell._index)
+            else:
+                open_rows.append(cell._index)
+        return open_rows, saturated_rows
+
+    # returns number of cancer neighbors at x,y
+    def cancer_neighbor_count(self, x, y):
+        total = 0
+        for offset_x, offset_y in self._neighbor_offsets:
+            coordinate_row = y + offset_y
+            coordinate_col = x + offset_x
+            if 0 <= coordinate_col < self.width and 0 <= coordinate_row < self.height:
+                if self.grid[coordinate_row][coordinate_col].cell_type == 'cancer':
+                    total += 1
+        return total
+
+    # fraction of the neighbors of x,y that are cancer cells (1.0 if there are no neighbors), counted in one scan
+    def local_pressure(self, x, y):
+        total_neighbors = 0
+        cancer_neighbors = 0
+        for offset_x, offset_y in self._neighbor_offsets:
+            coordinate_row = y + offset_y
+            coordinate_col = x + offset_x
+            if 0 <= coordinate_col < self.width and 0 <= coordinate_row < self.height:
+                total_neighbors += 1
+                if self.grid[coordinate_row][coordinate_col].cell_type == 'cancer':
+                    cancer_neighbors += 1
+        if total_neighbors == 0:
+            return 1.0
+        return cancer_neighbors / total_neighbors
+
+    # true when every neighbor of x,y is a cancer cell
+    def is_saturated(self, x, y):
+        for offset_x, offset_y in self._neighbor_offsets:
+            coordinate_row = y + offset_y
+            coordinate_col = x + offset_x
+            if 0 <= coordinate_col < self.width and 0 <= coordinate_row < self.height:
+                if self.grid[coordinate_row][coordinate_col].cell_type != 'cancer':
+                    return False
+        return True
 
-        max_mutations = 0
+    # returns a grid of mutation counts (0 for normal tissue)
+    def mutation_count_grid(self):
+        grid_data = np.zeros((self.height, self.width), dtype=int)
         for y in range(self.height):
             for x in range(self.width):
                 cell = self.grid[y][x]
                 if cell.cell_type == 'cancer':
                     grid_data[y][x] = cell.mutation_count
-                    max_mutations = max(max_mutations, cell.mutation_count)
+        return grid_data
+
+    # returns a grid of SUBTYPE_COLORS indices of the leading subtype (0 for normal tissue), for use with custom_cmap
+    def subtype_grid(self):
+        grid_data = np.zeros((self.height, self.width), dtype=int)
+        for y in range(self.height):
+            for x in range(self.width):
+                cell = self.grid[y][x]
+                if cell.cell_type == 'cancer':
+                    grid_data[y][x] = SUBTYPE_COLORS[cell.subtype[0]]
+        return grid_data
+
+    #plot leading subtype of every cancer cell
+    def visualize_subtypes(self):
+        plt.figure(figsize=(6, 6))
+        plt.imshow(self.subtype_grid(), cmap=custom_cmap, vmin=0, vmax=len(SUBTYPE_COLORS), interpolation='nearest')
+        plt.title('Tumor Subtypes')
+        plt.show()
+
+    #plot tumor using ascii/plt
+    def visualize(self):
+        grid_data = self.mutation_count_grid()
+        max_mutations = int(grid_data.max()) if grid_data.size else 0
 
         plt.figure(figsize=(6, 6))
         cmap = plt.cm.viridis  # can also try 'plasma', 'inferno', 'magma', etc.
@@ -167,151 +477,1296 @@ class Environment():
         plt.show()
 
 
+# Environment backend where occupancy and cell lookups live in numpy arrays instead of one Cell object per site.
+# Normal tissue never changes, so it is not stored at all: a normal Cell is only built when someone reads that
+# site (get_neighbors or grid[y][x]) and is kept only as long as the caller holds on to it.
+# The list-of-objects Environment above stays as the reference implementation.
+class ArrayEnvironment(Environment):
+    def __init__(self, width, height):
+        super().__init__(width, height)
+        self.grid = GridView(self)
+        self.initialize_grid()
+
+    # shape of the grid arrays, their axes are the site coordinates reversed ([y, x])
+    @property
+    def shape(self):
+        return (self.height, self.width)
+
+    # np.zeros hands back untouched zeroed pages, so setup does not pay for the empty sites
+    def initialize_grid(self):
+        # The arrays carry a one-site border around the grid, occupancy marks it OFF_GRID. A neighbor is then a
+        # fixed offset in the flattened arrays (flat_offsets, see _bind_grid) and scans need no bounds checks
+        padded_shape = tuple(size + 2 for size in self.shape)
+        padded_occupancy = self._zeros('padded_occupancy', padded_shape, np.uint8) # 1 where a cancer cell sits
+        for axis in range(len(padded_shape)):
+            padded_occupancy[(slice(None),) * axis + (0,)] = OFF_GRID
+            padded_occupancy[(slice(None),) * axis + (-1,)] = OFF_GRID
+        self._bind_grid(
+            padded_occupancy,
+            self._zeros('padded_cell_index', padded_shape, np.int32), # row in self.store, only meaningful where occupied
+            self._zeros('padded_neighbor_count', padded_shape, np.int8), # cancer neighbors, kept up to date on every placement
+        )
+        self.normal_cells = weakref.WeakValueDictionary() # normal cells handed out so far, keyed by position
+        # cancer cells on the grid are rows of this store, a Tumor growing here shares it as Tumor.cells
+        if getattr(self, 'store', None) is None:
+            self.store = self._new_store()
+        else:
+            self.store.clear()
+
+    # sets up the grid views over the padded arrays: occupancy, cell_index and neighbor_count are the grid itself,
+    # the flat_ arrays the whole padded arrays flattened, where site + flat_offsets are its neighbors
+    def _bind_grid(self, padded_occupancy, padded_cell_index, padded_neighbor_count):
+        inside = (slice(1, -1),) * len(self.shape)
+        self.padded_occupancy = padded_occupancy
+        self.padded_cell_index = padded_cell_index
+        self.padded_neighbor_count = padded_neighbor_count
+        self.occupancy = padded_occupancy[inside]
+        self.cell_index = padded_cell_index[inside]
+        self.neighbor_count = padded_neighbor_count[inside]
+        self.flat_occupancy = padded_occupancy.reshape(-1)
+        self.flat_cell_index = padded_cell_index.reshape(-1)
+        self.flat_neighbor_count = padded_neighbor_count.reshape(-1)
+        # steps in the flat arrays per unit of each site coordinate, (x, y[, z]) order
+        self.site_strides = np.cumprod((1,) + tuple(size + 2 for size in self.shape[::-1])[:-1])
+        self.flat_offsets = self.neighbor_offsets @ self.site_strides
+        self._site_strides = self.site_strides.tolist()
+        self._site_sizes = list(self.shape[::-1]) # grid size along each site coordinate
+        self._neighbor_offsets = self.neighbor_offsets.tolist()
+        self._flat_offsets = self.flat_offsets.tolist()
+        self._neighborhood_offsets = self._flat_offsets + [0] # the neighbors, then the site itself, as flat offsets
+        # the per-cell engines read and write single sites through memoryviews of the flat arrays, which gives
+        # python ints without building numpy scalars or index arrays
+        self._occupancy_view = memoryview(self.flat_occupancy)
+        self._cell_index_view = memoryview(self.flat_cell_index)
+        self._neighbor_count_view = memoryview(self.flat_neighbor_count)
+        self._free_directions = [] # handed out by free_directions, cleared on every call
+
+    # position of sites (an (..., dimensions) array) in the flat arrays
+    def flat_index(self, sites):
+        return (sites + 1) @ self.site_strides
+
+    # flat_index of a single site in plain python. Sites on the border are fine (they read as OFF_GRID), anything
+    # further out would land on another row of the flat arrays, so it raises IndexError like the list backend does
+    def _flat_site(self, site):
+        flat_site = 0
+        for coordinate, stride, size in zip(site, self._site_strides, self._site_sizes):
+            if not -1 <= coordinate <= size:
+                raise IndexError(f"site {site} is outside the grid and its border")
+            flat_site += (coordinate + 1) * stride
+        return flat_site
+
+    # allocation of the grid arrays and the cell store, SharedArrayEnvironment puts them in shared memory
+    def _zeros(self, name, shape, dtype):
+        return np.zeros(shape, dtype=dtype)
+
+    def _new_store(self):
+        return CellStore(dimensions=len(self.shape))
+
+    def site_count(self):
+        return int(np.prod(self.shape))
+
+    # index into the grid views for an (..., dimensions) array of sites
+    def site_index(self, sites):
+        return tuple(sites[..., axis] for axis in reversed(range(sites.shape[-1])))
+
+    def is_valid_position(self, *site):
+        return all(0 <= coordinate < size for coordinate, size in zip(site, self.shape[::-1]))
+
+    # returns the cell at site, normal tissue is materialized on demand
+    def get_cell(self, *site):
+        flat_site = self._flat_site(site)
+        if self._occupancy_view[flat_site] == 1:
+            return self.store.view(self._cell_index_view[flat_site])
+        cell = self.normal_cells.get(site)
+        if cell is None:
+            cell = Cell(site)
+            self.normal_cells[site] = cell
+        return cell
+
+    # unconditionally puts cell at site (what grid[y][x] = cell does for the list backend)
+    def set_cell(self, cell, *site):
+        flat_site = self._flat_site(site)
+        occupancy = self._occupancy_view
+        if cell.cell_type != 'cancer':
+            if occupancy[flat_site]:
+                self._add_neighbor_counts(site, -1)
+            occupancy[flat_site] = 0
+            self.normal_cells[site] = cell
+            return
+        self.normal_cells.pop(site, None)
+        self.store.append(cell)
+        if not occupancy[flat_site]:
+            self._add_neighbor_counts(site, 1)
+        self._cell_index_view[flat_site] = cell._index
+        occupancy[flat_site] = 1
+
+    # adds change to the neighbor count of the sites around site
+    def _add_neighbor_counts(self, site, change):
+        flat_site = self._flat_site(site)
+        neighbor_count = self._neighbor_count_view
+        for offset in self._flat_offsets:
+            neighbor_count[flat_site + offset] += change
+
+    # puts store rows on the grid at their own positions, rows must target distinct empty sites
+    def place_rows(self, rows):
+        sites = self.flat_index(self.store.position[rows])
+        self.flat_occupancy[sites] = 1
+        self.flat_cell_index[sites] = rows
+        np.add.at(self.flat_neighbor_count, (sites[:, None] + self.flat_offsets).ravel(), 1)
+
+    # number of on-grid neighbors (8 inside, 5 on an edge, 3 in a corner in 2D), works on scalars and arrays alike
+    def valid_neighbor_count(self, *site):
+        sites = 1
+        for coordinate, size in zip(site, self.shape[::-1]):
+            sites = sites * (np.minimum(coordinate + 1, size - 1) - np.maximum(coordinate - 1, 0) + 1)
+        return sites - 1
+
+    # valid_neighbor_count of a single site in plain python, the per-cell engines ask for it all the time
+    def _site_neighbor_count(self, site):
+        sites = 1
+        for coordinate, size in zip(site, self._site_sizes):
+            sites *= min(coordinate + 1, size - 1) - max(coordinate - 1, 0) + 1
+        return sites - 1
+
+    def cancer_neighbor_count(self, *site):
+        return self._neighbor_count_view[self._flat_site(site)]
+
+    def is_saturated(self, *site):
+        return self._neighbor_count_view[self._flat_site(site)] == self._site_neighbor_count(site)
+
+    def local_pressure(self, *site):
+        total_neighbors = self._site_neighbor_count(site)
+        if total_neighbors == 0:
+            return 1.0
+        return self._neighbor_count_view[self._flat_site(site)] / total_neighbors
+
+    # the border reads as occupied, so place_cell turns away sites just off the grid
+    def is_occupied(self, *site):
+        return bool(self._occupancy_view[self._flat_site(site)])
+
+    def place_cell(self, cell, *site):
+        if not self.is_occupied(*site):
+            self.set_cell(cell, *site)
+            return True
+        return False
+
+    # rows of self.store only need their index written to the flat arrays, no view is built for them
+    def place_row(self, store, row, *site):
+        if store is not self.store:
+            return super().place_row(store, row, *site)
+        flat_site = self._flat_site(site)
+        occupancy = self._occupancy_view
+        if occupancy[flat_site]:
+            return False
+        self.normal_cells.pop(site, None)
+        neighbor_count = self._neighbor_count_view
+        for offset in self._flat_offsets:
+            neighbor_count[flat_site + offset] += 1
+        self._cell_index_view[flat_site] = row
+        occupancy[flat_site] = 1
+        return True
+
+    def get_neighbors(self, *site):
+        index = self._flat_site(site) + self.flat_offsets
+        neighbors = []
+        for offset, occupancy, row in zip(self._neighbor_offsets, self.flat_occupancy[index].tolist(), self.flat_cell_index[index].tolist()):
+            if occupancy == 1:
+                neighbors.append(self.store.view(row))
+            elif occupancy == 0:
+                neighbors.append(self.get_cell(*offset_site(site, offset)))
+        return neighbors
+
+    # the off-grid border reads as occupied, so no bounds checks are needed
+    def free_directions(self, site, best_gaps=False):
+        flat_site = self._flat_site(site)
+        occupancy = self._occupancy_view
+        neighbor_count = self._neighbor_count_view
+        directions = self._free_directions
+        directions.clear()
+        best = 0
+        for direction, offset in enumerate(self._flat_offsets):
+            neighbor = flat_site + offset
+            if occupancy[neighbor]:
+                continue
+            if best_gaps:
+                gap = neighbor_count[neighbor]
+                if gap < best:
+                    continue
+                if gap > best:
+                    best = gap
+                    directions.clear()
+            directions.append(direction)
+        return directions
+
+    def neighbor_site(self, site, direction):
+        return offset_site(site, self._neighbor_offsets[direction])
+
+    # works on the flat arrays, no cell views are built and normal tissue around site is not materialized. Cells on
+    # this grid are always rows of self.store
+    def frontier_changes(self, site, store):
+        flat_site = self._flat_site(site)
+        occupancy = self._occupancy_view
+        cell_index = self._cell_index_view
+        open_rows, saturated_rows = [], []
+        for offset in self._neighborhood_offsets:
+            neighbor = flat_site + offset
+            if occupancy[neighbor] != 1:
+                continue
+            for step in self._flat_offsets:
+                if not occupancy[neighbor + step]:
+                    open_rows.append(cell_index[neighbor])
+                    break
+            else:
+                saturated_rows.append(cell_index[neighbor])
+        return open_rows, saturated_rows
+
+    def mutation_count_grid(self):
+        grid_data = np.zeros(self.shape, dtype=int)
+        occupied = self.occupancy == 1
+        grid_data[occupied] = popcount(self.store.mutation_masks(self.cell_index[occupied]))
+        return grid_data
+
+    def subtype_grid(self):
+        grid_data = np.zeros(self.shape, dtype=int)
+        occupied = self.occupancy == 1
+        grid_data[occupied] = subtype_color_indices(self.store.traits(self.cell_index[occupied]))
+        return grid_data
+
+
+# 3D lattice for spheroid growth: sites are (x, y, z) and every site has 26 neighbors (Moore neighborhood), the
+# arrays are indexed [z, y, x]. Runs every engine that runs on ArrayEnvironment except 'parallel'. Snapshots are
+# 2D: mutation_count_grid() is the maximum projection along z (the most mutated cell on each line of sight) and
+# subtype_grid() the middle plane, pass z for the plane at that depth instead. There is no grid[y][x], use get_cell
+class ArrayEnvironment3D(ArrayEnvironment):
+    neighbor_offsets = NEIGHBOR_OFFSETS_3D
+
+    def __init__(self, width, height, depth):
+        self.depth = depth
+        super().__init__(width, height)
+        self.grid = None
+
+    @property
+    def shape(self):
+        return (self.depth, self.height, self.width)
+
+    def center(self):
+        return self.width // 2, self.height // 2, self.depth // 2
+
+    def mutation_count_grid(self, z=None):
+        volume = np.zeros(self.shape, dtype=np.uint8)
+        occupied = self.occupancy == 1
+        volume[occupied] = popcount(self.store.mutation_masks(self.cell_index[occupied]))
+        return (volume.max(axis=0) if z is None else volume[z]).astype(int)
+
+    def subtype_grid(self, z=None):
+        z = self.depth // 2 if z is None else z
+        grid_data = np.zeros(self.shape[1:], dtype=int)
+        occupied = self.occupancy[z] == 1
+        grid_data[occupied] = subtype_color_indices(self.store.traits(self.cell_index[z][occupied]))
+        return grid_data
+
+
+# array over a shared memory block, the block is closed (unmapped) once the array and all its views are gone.
+# np.frombuffer keeps the block's buffer exported meanwhile, so nothing can unmap memory the array still points to
+def shared_array(block, shape, dtype):
+    array = np.frombuffer(block.buf, dtype=dtype, count=int(np.prod(shape)))
+    weakref.finalize(array.base, block.close).atexit = False
+    return array.reshape(shape)
+
+
+# numpy arrays in multiprocessing.shared_memory blocks, keyed by name (one live block per key). Other processes map
+# them by the block names in specs(). A block is unlinked as soon as it is replaced, its memory goes away with the
+# last process that still maps it. Only the process that created a block unlinks it: forked workers inherit copies
+# of every SharedBlocks alive at the fork, and their finalizers must not pull the blocks from under the coordinator
+class SharedBlocks():
+    def __init__(self):
+        self.blocks = {} # key -> (block, shape, dtype, pid of the process that created the block)
+
+    # zeroed array for key in a new block (fresh shared memory is zero-filled), replacing the previous one
+    def zeros(self, key, shape, dtype):
+        dtype = np.dtype(dtype)
+        block = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        self.release(key)
+        self.blocks[key] = (block, tuple(shape), dtype.str, os.getpid())
+        return shared_array(block, shape, dtype)
+
+    # forgets the block of key, unlinking it when this process created it. A block that is already gone is fine
+    def release(self, key):
+        if key not in self.blocks:
+            return
+        block, _, _, creator = self.blocks.pop(key)
+        if creator != os.getpid():
+            return
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass
+
+    # what a worker needs to map the current blocks: key -> (block name, shape, dtype)
+    def specs(self):
+        return {key: (block.name, shape, dtype) for key, (block, shape, dtype, _) in self.blocks.items()}
+
+    def close(self):
+        for key in list(self.blocks):
+            self.release(key)
+
+
+# ArrayEnvironment whose grid arrays and cell store live in shared memory, so the 'parallel' engine's worker
+# processes can step bands of rows of it in place (see TileWorkers). The blocks are freed with the environment.
+class SharedArrayEnvironment(ArrayEnvironment):
+    def __init__(self, width, height):
+        self.shared = SharedBlocks()
+        weakref.finalize(self, self.shared.close)
+        super().__init__(width, height)
+
+    def _zeros(self, name, shape, dtype):
+        return self.shared.zeros(name, shape, dtype)
+
+    def _new_store(self):
+        return SharedCellStore(self.shared, dimensions=len(self.shape))
+
+    # the grid rows split into count bands of (almost) equal height, as (first row, end row) pairs
+    def strips(self, count):
+        bounds = np.linspace(0, self.height, min(count, self.height) + 1).astype(int)
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    # environment over the blocks of another process, arrays maps the keys of its SharedBlocks.specs() to arrays,
+    # size is the number of cells in its store and founders the founder traits of its GenotypeRegistry
+    @classmethod
+    def attach(cls, width, height, arrays, size, founders):
+        environment = cls.__new__(cls)
+        Environment.__init__(environment, width, height)
+        environment._bind_grid(arrays['padded_occupancy'], arrays['padded_cell_index'], arrays['padded_neighbor_count'])
+        environment.store = CellStore.__new__(CellStore)
+        for name in CellStore.COLUMNS:
+            setattr(environment.store, name, arrays[name])
+        environment.store.capacity = len(arrays['birth'])
+        environment.store.size = size
+        environment.store.genotypes = GenotypeRegistry(founders)
+        return environment
+
+
+# Environment without edges for tumors whose extent is not known up front. The plane is cut into
+# tile_size x tile_size tiles, created the first time a cancer cell lands in or next to one, so memory follows the
+# tumor's footprint. Every site has 8 neighbors and there is no carrying capacity (site_count is infinite), the
+# first cell goes to (0, 0) and coordinates can be negative. Like ArrayEnvironment it keeps cancer cells in its own
+# store and materializes normal tissue on demand. Runs the reference and gillespie engines. width and height are
+# the extent of the tumor (see bounds), snapshots are dense arrays cropped to it
+class SparseEnvironment(Environment):
+    def __init__(self, tile_size=64):
+        if tile_size < 1:
+            raise ValueError("tile_size must be at least 1")
+        self.tile_size = tile_size
+        self.store = None
+        self.initialize_grid()
+
+    def initialize_grid(self):
+        # (tile x, tile y) -> (cell_index, neighbor_count) of the tile's sites, cell_index is -1 where no cancer cell sits
+        self.tiles = {}
+        self.normal_cells = weakref.WeakValueDictionary() # normal cells handed out so far, keyed by position
+        if self.store is None:
+            self.store = CellStore()
+        else:
+            self.store.clear()
+
+    # tile arrays holding x,y and the site's offsets in them, None when the tile does not exist and create is false
+    def _tile(self, x, y, create=False):
+        tile_key = (x // self.tile_size, y // self.tile_size)
+        tile = self.tiles.get(tile_key)
+        if tile is None:
+            if not create:
+                return None, 0, 0
+            tile = (np.full((self.tile_size, self.tile_size), -1, dtype=np.int32),
+                    np.zeros((self.tile_size, self.tile_size), dtype=np.int8))
+            self.tiles[tile_key] = tile
+        return tile, y % self.tile_size, x % self.tile_size
+
+    def site_count(self):
+        return float('inf')
+
+    def center(self):
+        return 0, 0
+
+    # (x0, y0, x1, y1) box around every cancer cell, x1 and y1 exclusive, None while there is none
+    def bounds(self):
+        boxes = []
+        for (tile_x, tile_y), (cell_index, _) in self.tiles.items():
+            ys, xs = np.nonzero(cell_index >= 0)
+            if xs.size:
+                x0 = tile_x * self.tile_size
+                y0 = tile_y * self.tile_size
+                boxes.append((x0 + xs.min(), y0 + ys.min(), x0 + xs.max() + 1, y0 + ys.max() + 1))
+        if not boxes:
+            return None
+        boxes = np.array(boxes)
+        return int(boxes[:, 0].min()), int(boxes[:, 1].min()), int(boxes[:, 2].max()), int(boxes[:, 3].max())
+
+    @property
+    def width(self):
+        box = self.bounds()
+        return 0 if box is None else box[2] - box[0]
+
+    @property
+    def height(self):
+        box = self.bounds()
+        return 0 if box is None else box[3] - box[1]
+
+    def is_valid_position(self, x, y):
+        return True
+
+    def get_cell(self, x, y):
+        tile, row, col = self._tile(x, y)
+        if tile is not None and tile[0][row, col] >= 0:
+            return self.store.view(tile[0][row, col])
+        cell = self.normal_cells.get((x, y))
+        if cell is None:
+            cell = Cell((x, y))
+            self.normal_cells[(x, y)] = cell
+        return cell
+
+    # unconditionally puts cell at x,y
+    def set_cell(self, cell, x, y):
+        tile, row, col = self._tile(x, y, create=cell.cell_type == 'cancer')
+        if cell.cell_type != 'cancer':
+            if tile is not None and tile[0][row, col] >= 0:
+                tile[0][row, col] = -1
+                self._add_neighbor_counts(x, y, -1)
+            self.normal_cells[(x, y)] = cell
+            return
+        self.normal_cells.pop((x, y), None)
+        self.store.append(cell)
+        if tile[0][row, col] < 0:
+            self._add_neighbor_counts(x, y, 1)
+        tile[0][row, col] = cell._index
+
+    # adds change to the neighbor count of the 8 sites around x,y, creating their tiles as needed
+    def _add_neighbor_counts(self, x, y, change):
+        for offset_x, offset_y in self._neighbor_offsets:
+            tile, row, col = self._tile(x + offset_x, y + offset_y, create=True)
+            tile[1][row, col] += change
+
+    def is_occupied(self, x, y):
+        tile, row, col = self._tile(x, y)
+        return tile is not None and bool(tile[0][row, col] >= 0)
+
+    def place_cell(self, cell, x, y):
+        if not self.is_occupied(x, y):
+            self.set_cell(cell, x, y)
+            return True
+        return False
+
+    def get_neighbors(self, x, y):
+        return [self.get_cell(x + offset_x, y + offset_y) for offset_x, offset_y in self._neighbor_offsets]
+
+    def cancer_neighbor_count(self, x, y):
+        tile, row, col = self._tile(x, y)
+        return 0 if tile is None else int(tile[1][row, col])
+
+    def local_pressure(self, x, y):
+        return self.cancer_neighbor_count(x, y) / len(self.neighbor_offsets)
+
+    def is_saturated(self, x, y):
+        return self.cancer_neighbor_count(x, y) == len(self.neighbor_offsets)
+
+    # rows of the cancer cells inside box (x0, y0, x1, y1) and their offsets in it
+    def _rows_in(self, box):
+        x0, y0, x1, y1 = box
+        rows, ys, xs = [], [], []
+        for (tile_x, tile_y), (cell_index, _) in self.tiles.items():
+            tile_ys, tile_xs = np.nonzero(cell_index >= 0)
+            site_xs = tile_x * self.tile_size + tile_xs
+            site_ys = tile_y * self.tile_size + tile_ys
+            inside = (site_xs >= x0) & (site_xs < x1) & (site_ys >= y0) & (site_ys < y1)
+            rows.append(cell_index[tile_ys[inside], tile_xs[inside]])
+            ys.append(site_ys[inside] - y0)
+            xs.append(site_xs[inside] - x0)
+        if not rows:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        return np.concatenate(rows), np.concatenate(ys), np.concatenate(xs)
+
+    # mutation counts over box (x0, y0, x1, y1), the tumor's bounds by default. Row 0, column 0 of the result is
+    # site (x0, y0)
+    def mutation_count_grid(self, box=None):
+        box = box or self.bounds() or (0, 0, 0, 0)
+        grid_data = np.zeros((box[3] - box[1], box[2] - box[0]), dtype=int)
+        rows, ys, xs = self._rows_in(box)
+        grid_data[ys, xs] = popcount(self.store.mutation_masks(rows))
+        return grid_data
+
+    # subtype_grid over box (x0, y0, x1, y1), the tumor's bounds by default
+    def subtype_grid(self, box=None):
+        box = box or self.bounds() or (0, 0, 0, 0)
+        grid_data = np.zeros((box[3] - box[1], box[2] - box[0]), dtype=int)
+        rows, ys, xs = self._rows_in(box)
+        grid_data[ys, xs] = subtype_color_indices(self.store.traits(rows))
+        return grid_data
+
+
+# grid[y][x] style access for ArrayEnvironment so code written against the list backend keeps working
+class GridView():
+    def __init__(self, environment):
+        self.environment = environment
+
+    def __len__(self):
+        return self.environment.height
+
+    def __getitem__(self, y):
+        if not 0 <= y < self.environment.height:
+            raise IndexError("grid row out of range")
+        return GridRow(self.environment, y)
+
+    def __iter__(self):
+        for y in range(self.environment.height):
+            yield GridRow(self.environment, y)
+
+
+class GridRow():
+    def __init__(self, environment, y):
+        self.environment = environment
+        self.y = y
 
+    def __len__(self):
+        return self.environment.width
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.environment.width:
+            raise IndexError("grid column out of range")
+        return self.environment.get_cell(x, self.y)
+
+    def __setitem__(self, x, cell):
+        if not 0 <= x < self.environment.width:
+            raise IndexError("grid column out of range")
+        self.environment.set_cell(cell, x, self.y)
+
+    def __iter__(self):
+        for x in range(self.environment.width):
+            yield self.environment.get_cell(x, self.y)
+
+
+
+
+# callbacks an observer can implement, in the order they fire during a step
+OBSERVER_EVENTS = ('on_step_begin', 'on_mutation', 'on_division', 'on_snapshot', 'on_step_end')
+
+# names accepted by Tumor(engine=...)
+ENGINES = ('reference', 'vectorized', 'gillespie', 'tau_leap', 'parallel')
+# engines that can draw from counter-based streams (Tumor(seed=...)), the others make several draws of a kind per
+# cell and step
+SEEDED_ENGINES = ('reference', 'vectorized', 'parallel')
+# engines that can draw mutations as waiting times (Tumor(scheduled_mutations=True)), gillespie and tau_leap have
+# their own event scheme
+SCHEDULED_MUTATION_ENGINES = ('reference', 'vectorized')
 
 class Tumor():
 
-    def __init__(self,environment):
+    # engine 'reference' steps cell by cell in random order, 'vectorized' steps the whole population with array
+    # operations (needs an ArrayEnvironment), 'gillespie' runs the same rules in continuous time (see step_gillespie)
+    # and 'tau_leap' advances up to max_leap steps at once, tau_epsilon sets how long the leaps are (see plan_leap).
+    # 'parallel' is the vectorized engine split over workers processes (one per CPU by default) on a
+    # SharedArrayEnvironment (see step_parallel), call close() to stop them early.
+    # With a seed every decision draws from counter-based streams (see counter_uniform) instead of the random module,
+    # so trajectories only depend on the seed, not on the order cells are visited in. The parallel engine always
+    # draws from them, it picks a seed from the random module when none is given.
+    # scheduled_mutations draws each cell's next mutation once as a geometric waiting time (see MutationSchedule)
+    # instead of a draw per cell and step, same distribution with about 1 / mutation chance times fewer draws.
+    # synchronous switches the reference engine to synchronous updates (see step_reference), the rule the
+    # vectorized and parallel engines implement with array operations
+    def __init__(self,environment, engine='reference', tau_epsilon=0.3, max_leap=10, seed=None, workers=None,
+                 scheduled_mutations=False, synchronous=False):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
+        if engine in ('vectorized', 'tau_leap') and not isinstance(environment, ArrayEnvironment):
+            raise ValueError(f"the {engine} engine needs an ArrayEnvironment")
+        if tau_epsilon <= 0 or max_leap < 1:
+            raise ValueError("tau_epsilon must be positive and max_leap at least 1")
+        if engine == 'parallel' and not isinstance(environment, SharedArrayEnvironment):
+            raise ValueError("the parallel engine needs a SharedArrayEnvironment")
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be at least 1")
+        if seed is not None and engine not in SEEDED_ENGINES:
+            raise ValueError(f"counter-based streams need one of the engines {SEEDED_ENGINES}")
+        if scheduled_mutations and engine not in SCHEDULED_MUTATION_ENGINES:
+            raise ValueError(f"scheduled mutations need one of the engines {SCHEDULED_MUTATION_ENGINES}")
+        if synchronous and engine != 'reference':
+            raise ValueError("synchronous updates are an option of the reference engine, the array engines always use them")
+        if engine == 'parallel' and seed is None:
+            seed = random.getrandbits(63)
         self.iteration_count = 0
-        self.cells = [] # list of all cancerous cells
         self.environment = environment#the environment in which the tumor grows
+        self.engine = engine
+        self.synchronous = synchronous
+        # all cancerous cells, stored column-wise (shared with the grid when the environment keeps its own store)
+        self.cells = environment.store if isinstance(environment, (ArrayEnvironment, SparseEnvironment)) else CellStore()
+        self.seed = seed
+        self.cells.seed = seed
         self.mutation_frames = []
         self.history = [] 
+        self.rng = np.random.default_rng(random.getrandbits(64)) if engine in ('vectorized', 'tau_leap') else None
+        self.tau_epsilon = tau_epsilon
+        self.max_leap = max_leap
+        # parallel engine: number of worker processes and the running TileWorkers, started by the first step
+        self.workers = workers or os.cpu_count() or 1
+        self.tile_workers = None
+        # rows of cells with at least one free neighbor, only these are considered for division
+        self.frontier = set()
+        # pending mutations with scheduled_mutations or once the tumor is saturated (see step_saturated), None before
+        self.mutation_schedule = MutationSchedule() if scheduled_mutations else None
+        # gillespie engine: simulated time, pending (time, row, version) events and the current version of each row's
+        # event, an event whose version is out of date was superseded by a reschedule
+        self.time = 0.0
+        self.event_queue = []
+        self.event_versions = []
+        # callbacks per event as (cadence in steps, callback), see add_observer
+        self.observers = {event: [] for event in OBSERVER_EVENTS}
+        self.due_observers = {event: [] for event in OBSERVER_EVENTS}
+        # values reported by store_step, each one kept up to date incrementally (see StepMetric)
+        self.metrics = {}
+        for metric in (CellCountMetric(), AverageAgeMetric(), AverageMutationsMetric()):
+            self.register_metric(metric)
+
+    # adds a per-step metric to the history rows, it starts from the current state of the tumor
+    def register_metric(self, metric):
+        metric.reset(self)
+        self.metrics[metric.name] = metric
+        return metric
+
+    # recomputes every metric from scratch, needed after cells were edited behind the tumor's back
+    def refresh_metrics(self):
+        for metric in self.metrics.values():
+            metric.reset(self)
+
+    # Subscribes observer to the events in OBSERVER_EVENTS it has a method for:
+    #   on_step_begin(tumor), on_step_end(tumor), on_division(tumor, parent, daughter), on_mutation(tumor, cell),
+    #   on_snapshot(tumor, mutation_count_grid)
+    # Keyword arguments set the cadence of an event in steps, e.g. add_observer(obs, on_step_end=5). Snapshots
+    # default to every ANIMATION_INTERVAL steps, everything else to every step.
+    def add_observer(self, observer, **cadence):
+        unknown = set(cadence) - set(OBSERVER_EVENTS)
+        if unknown:
+            raise ValueError(f"unknown observer events {sorted(unknown)}")
+        for event, every in cadence.items():
+            if every < 1:
+                raise ValueError(f"cadence of {event} must be at least 1 step, got {every}")
+        for event in OBSERVER_EVENTS:
+            callback = getattr(observer, event, None)
+            if callback is not None:
+                every = cadence.get(event, ANIMATION_INTERVAL if event == 'on_snapshot' else 1)
+                self.observers[event].append((every, callback))
+        return observer
+
+    def remove_observer(self, observer):
+        for event, callbacks in self.observers.items():
+            self.observers[event] = [(every, callback) for every, callback in callbacks
+                                     if getattr(callback, '__self__', None) is not observer]
+
+    def _notify(self, event, *args):
+        for callback in self.due_observers[event]:
+            callback(self, *args)
+
+    def _cells_added(self, rows):
+        for metric in self.metrics.values():
+            metric.on_cells_added(self, rows)
+
+    # a step finished, aged_cells cells got one step older
+    def _cells_aged(self, aged_cells):
+        for metric in self.metrics.values():
+            metric.on_step(self, aged_cells)
+
+    def _cells_divided(self, parents, daughters):
+        self._cells_added(daughters)
+        if self.due_observers['on_division']:
+            for parent, daughter in zip(parents, daughters):
+                self._notify('on_division', self.cells.view(parent), self.cells.view(daughter))
+
+    def _cells_mutated(self, rows):
+        for metric in self.metrics.values():
+            metric.on_mutations(self, rows)
+        if self.due_observers['on_mutation']:
+            for row in rows:
+                self._notify('on_mutation', self.cells.view(row))
 
     def seed_initial_cancer(self, cancer_cell=None):
         """Seeds the initial cancer cell in the middle of the environment grid."""
-        middle_x = self.environment.width // 2
-        middle_y = self.environment.height // 2
-        position = (middle_x, middle_y)
+        position = self.environment.center()
 
         if cancer_cell is None:
             cancer_cell = Cancer_Cell(position=position)
 
-        self.environment.place_cell(cancer_cell, position[0], position[1])
         self.cells.append(cancer_cell)
+        self.environment.place_cell(cancer_cell, *position)
+        self.update_frontier(*position)
+        self._cells_added([cancer_cell._index])
         return self
 
-    # run one iteration, growing cells and checking for division
-    def step(self):
-        self.iteration_count += 1
+    # True once the tumor fills CARRYING_CAPACITY of the sites: the global factor of should_divide is 0 from then on
+    # and cells never die, so no cell can divide again
+    def is_saturated(self):
+        global_tumor_fraction = len(self.cells) / self.environment.site_count()
+        return 1 - (global_tumor_fraction / CARRYING_CAPACITY) <= 0
+
+    # run one iteration, growing cells and checking for division (the tau_leap engine covers several steps per call,
+    # at most max_steps of them, and history gets one row per leap: use run to stop at a given step)
+    # A saturated tumor only ages and mutates, every engine but gillespie (which draws no idle steps anyway) then
+    # hands its steps to step_saturated
+    def step(self, max_steps=None):
+        if max_steps is not None and max_steps < 1:
+            raise ValueError("max_steps must be at least 1")
+        steps = 1
+        saturated = self.engine != 'gillespie' and self.is_saturated()
+        if self.engine == 'tau_leap' and not saturated:
+            steps, mutation_chance = self.plan_leap(max_steps)
+        previous_count = self.iteration_count
+        self.iteration_count += steps
+        self.cells.step = self.iteration_count
+        aged_cells = len(self.cells) # everyone alive at the start of the step gets one step older
+        # an observer is due when the step count passed a multiple of its cadence
+        for event, callbacks in self.observers.items():
+            self.due_observers[event] = [callback for every, callback in callbacks
+                                         if self.iteration_count // every > previous_count // every]
+        self._notify('on_step_begin')
+
+        if saturated:
+            self.step_saturated()
+        elif self.engine == 'vectorized':
+            self.step_vectorized()
+        elif self.engine == 'gillespie':
+            self.step_gillespie()
+        elif self.engine == 'tau_leap':
+            self.step_tau_leap(steps, mutation_chance) # reports the ageing of each step itself
+        elif self.engine == 'parallel':
+            self.step_parallel()
+        else:
+            self.step_reference()
+        if self.engine != 'tau_leap' or saturated:
+            self._cells_aged(aged_cells)
+
+        if self.due_observers['on_snapshot']:
+            self._notify('on_snapshot', self.get_mutation_count_grid())
+        self._notify('on_step_end')
+
+    # advances the tumor by steps steps and returns it. Every engine ends exactly there, tau_leap leaps are cut short
+    # at the end instead of running past it
+    def run(self, steps):
+        end = self.iteration_count + steps
+        while self.iteration_count < end:
+            self.step(max_steps=end - self.iteration_count)
+        return self
 
+    # Cells take their turn in random order. By default each division lands right away, so later cells see the
+    # pressure it adds. With synchronous updates every cell reads the start-of-step grid instead: a division only
+    # claims its site in a second buffer (see _claim_site), and once every cell had its turn the claim with the
+    # lowest priority draw wins each site and the daughters are placed (see place_claims). That is the rule of the
+    # vectorized and parallel engines, with the same seed the results are bit-for-bit theirs
+    def step_reference(self):
+        cells = self.cells
         # Compute global tumor occupancy
-        total_cells = len(self.cells)
-        total_spaces = self.environment.width * self.environment.height
+        total_cells = len(cells)
+        total_spaces = self.environment.site_count()
         global_tumor_fraction = total_cells / total_spaces
 
-        # Shuffle for stochastic division
-        shuffled_cells = self.cells[:]
-        random.shuffle(shuffled_cells)
-
-        for c in shuffled_cells:
-            c.grow()
-
-            if isinstance(c, Cancer_Cell):
-                pressure = self.get_local_pressure(c)
+        # Shuffle for stochastic division (daughters born during this step wait for the next one)
+        if self.seed is None:
+            shuffled_indices = list(range(total_cells))
+            random.shuffle(shuffled_indices)
+        else:
+            shuffled_indices = np.argsort(self._uniforms(np.arange(total_cells), DRAW_ORDER)).tolist()
+
+        due = None if self.mutation_schedule is None else set(self.due_mutations().tolist())
+        claims = {} if self.synchronous else None # target site -> (priority draw, parent row)
+
+        # The loop works on rows and plain python lists, a Cancer_Cell view is only built for cells that mutate or
+        # divide. Traits are gathered for all rows up front: a cell's genotype only changes when it mutates itself,
+        # so they stay current until then, and a cell that mutated reads its own again
+        traits = cells.traits(slice(0, total_cells))
+        mutation_chance = (traits[:, TRAIT_INDEX['mutation_rate']] * traits[:, TRAIT_INDEX['aggressiveness']]).tolist()
+        proliferation_chance = traits[:, TRAIT_INDEX['proliferation_chance']].tolist()
+        pressure_sensitivity = traits[:, TRAIT_INDEX['pressure_sensitivity']].tolist()
+        division_columns = [TRAIT_INDEX['proliferation_chance'], TRAIT_INDEX['pressure_sensitivity']]
+        positions = cells.position[:total_cells].tolist()
+        seed = cells.seed
+        mutation_draws = None
+        if seed is not None and due is None:
+            mutation_draws = self._uniforms(np.arange(total_cells), DRAW_MUTATION).tolist()
+
+        # interior cells (no free neighbor) only mutate, they could not place a daughter anyway. Everyone got one step
+        # older when cells.step moved on (see CellStore.birth)
+        for index in shuffled_indices:
+            if due is not None:
+                mutating = index in due
+            elif mutation_draws is None:
+                mutating = random.random() < mutation_chance[index]
+            else:
+                mutating = mutation_draws[index] < mutation_chance[index]
+            mutated = mutating and cells.view(index).add_random_mutation()
+            if mutated:
+                self._cells_mutated([index])
+
+            if index in self.frontier:
+                position = positions[index]
+                pressure = self.environment.local_pressure(*position)
+                if mutated:
+                    chance, sensitivity = cells.traits(index)[division_columns].tolist()
+                else:
+                    chance, sensitivity = proliferation_chance[index], pressure_sensitivity[index]
 
                 # Pass both local and global pressure to division logic
-                if c.should_divide(pressure, global_tumor_fraction):
-                    self.divide_cell(c)
-
-        if self.iteration_count % 10 == 0:
-            self.mutation_frames.append(self.get_mutation_count_grid())
-
-        # DEBUG
-        print(f"Step {self.iteration_count}: {len(self.cells)} cancer cells")
-
-        self.store_step()
+                chance = division_chance(chance, sensitivity, pressure, global_tumor_fraction)
+                if seed is None:
+                    draw = random.random()
+                else:
+                    draw = counter_uniform(seed, cells.step, site_key(*position), DRAW_DIVISION)
+                if draw < chance:
+                    if claims is None:
+                        self.divide_cell(cells.view(index))
+                    else:
+                        self._claim_site(claims, cells.view(index))
+
+        if claims:
+            self.place_claims(claims)
+        if due:
+            self._schedule_mutations(np.array(sorted(due), dtype=np.int64), self.iteration_count)
+
+    # synchronous step_reference: cell claims the site its division would take on the start-of-step grid, the claim
+    # with the lowest priority draw keeps a site (the lower parent row on equal draws, like winning_proposals)
+    def _claim_site(self, claims, cell):
+        site = self.choose_division_site(cell)
+        if site is None:
+            return
+        claim = (cell.uniform(DRAW_PRIORITY), cell._index)
+        if claims.get(site, claim) >= claim:
+            claims[site] = claim
+
+    # places the daughters of the winning claims, ordered by site with the last coordinate slowest (the order
+    # place_divisions appends them in)
+    def place_claims(self, claims):
+        for site in sorted(claims, key=lambda site: site[::-1]):
+            self.place_daughter(self.cells[claims[site][1]], site)
+
+    # Same rules as step_reference applied to the whole population at once: draw all mutations,
+    # draw all divisions against the start-of-step grid, then let each dividing cell claim one empty neighbor.
+    # Two parents that pick the same site are resolved by a random priority, the loser does not divide this step.
+    def step_vectorized(self):
+        cells = self.cells
+        environment = self.environment
+        rng = self.rng
+        total_cells = len(cells)
+        if total_cells == 0:
+            return
+        global_tumor_fraction = total_cells / environment.site_count()
+
+        if self.mutation_schedule is not None:
+            self.mutate_due()
+        else:
+            traits = cells.traits(slice(0, total_cells))
+            mutation_chance = traits[:, TRAIT_INDEX['mutation_rate']] * traits[:, TRAIT_INDEX['aggressiveness']]
+            mutating = np.flatnonzero(self._uniforms(np.arange(total_cells), DRAW_MUTATION) < mutation_chance)
+            if mutating.size:
+                gene_draws = None if self.seed is None else self._uniforms(mutating, DRAW_GENE, len(MUTATION_TYPES))
+                self._cells_mutated(mutate_rows(cells, mutating, rng, gene_draws))
+
+        self.divide_frontier(global_tumor_fraction)
+
+    # step_vectorized split over worker processes, each one owning a band of rows of the SharedArrayEnvironment
+    # (see step_tile): workers mutate their cells and propose divisions against the start-of-step grid,
+    # then the coordinator resolves conflicts and places the daughters, so the grid, metrics and history only change
+    # here. All draws are counter-based, the result is bit-for-bit the vectorized one with the same seed, whatever
+    # the number of workers
+    def step_parallel(self):
+        if len(self.cells) == 0:
+            return
+        if self.tile_workers is None:
+            self.tile_workers = TileWorkers(self.environment, self.workers)
+        mutated, previous, proposals = self.tile_workers.step(self.environment, self.seed, self.iteration_count)
+        if mutated.size:
+            # the workers only see a copy of the genotype registry, the clone sizes are kept here
+            self.cells.genotypes.count(previous, -1)
+            self.cells.genotypes.count(self.cells.genotype[mutated], 1)
+            self._cells_mutated(mutated)
+        self.place_divisions(*proposals)
+
+    # stops the worker processes of the parallel engine (they also stop with the tumor), the next step restarts them
+    def close(self):
+        if self.tile_workers is not None:
+            self.tile_workers.close()
+            self.tile_workers = None
+
+    # Step of a saturated tumor (see is_saturated): nothing divides any more, so besides ageing (free, see
+    # CellStore.birth) the step only mutates the cells whose next mutation is due. Mutations are fast-forwarded
+    # with geometric waiting times (see MutationSchedule), whether the tumor was stepped with scheduled_mutations or not
+    def step_saturated(self):
+        if self.mutation_schedule is None:
+            self.mutation_schedule = MutationSchedule()
+        self.mutate_due()
+
+    # mutates the rows whose scheduled mutation falls on this step and schedules their next one
+    def mutate_due(self):
+        due = self.due_mutations()
+        if due.size == 0:
+            return
+        if self.rng is None:
+            self.rng = np.random.default_rng(random.getrandbits(64))
+        gene_draws = None if self.seed is None else self._uniforms(due, DRAW_GENE, len(MUTATION_TYPES))
+        mutated = mutate_rows(self.cells, due, self.rng, gene_draws)
+        if mutated.size:
+            self._cells_mutated(mutated)
+        self._schedule_mutations(due, self.iteration_count)
+
+    # rows whose scheduled mutation falls on this step (sorted), the caller mutates them and schedules their next
+    # one. Rows the schedule has not seen yet (daughters, the first cells) are scheduled first, from the step before
+    # this one so they may mutate on this very step
+    def due_mutations(self):
+        schedule = self.mutation_schedule
+        if schedule.rows < len(self.cells):
+            self._schedule_mutations(np.arange(schedule.rows, len(self.cells)), self.iteration_count - 1)
+            schedule.rows = len(self.cells)
+        return schedule.pop(self.iteration_count)
+
+    # schedules the next mutation of rows after step with their current mutation chance, the waiting times are
+    # drawn from the stream of that step
+    def _schedule_mutations(self, rows, step):
+        traits = self.cells.traits(rows)
+        chance = traits[:, TRAIT_INDEX['mutation_rate']] * traits[:, TRAIT_INDEX['aggressiveness']]
+        chance[self.cells.mutation_masks(rows) == ALL_MUTATIONS_MASK] = 0.0
+        if self.seed is not None:
+            uniforms = row_uniforms(self.cells, self.seed, step, rows, DRAW_WAIT)
+        else:
+            if self.rng is None:
+                self.rng = np.random.default_rng(random.getrandbits(64))
+            uniforms = self.rng.random(len(rows))
+        self.mutation_schedule.schedule(rows, chance, uniforms, step)
+
+    # division half of step_vectorized: draws the divisions of the frontier against the current grid and places the
+    # daughters, returns their rows (ArrayEnvironment only)
+    def divide_frontier(self, global_tumor_fraction):
+        frontier, effective_chance = self.division_chances(global_tumor_fraction)
+        proposals = propose_divisions(self.cells, self.environment, frontier, effective_chance, self._uniforms)
+        return self.place_divisions(*proposals)
+
+    # places clones of rows parents at positions (distinct empty sites) in one batch and keeps the grid, the frontier
+    # and the metrics consistent, returns the new rows. Sets up large tumors without growing them (ArrayEnvironment
+    # only)
+    def place_clones(self, parents, positions):
+        rows = self.cells.append_clones(parents, positions)
+        self.environment.place_rows(rows)
+        self.update_frontier_rows(rows)
+        self._cells_added(rows)
+        return rows
+
+    # resolves the division proposals (see propose_divisions) of a step and places the winning daughters
+    def place_divisions(self, parents, targets, priority):
+        if parents.size == 0:
+            return parents
+        winners = winning_proposals(self.environment, targets, priority)
+        daughters = self.cells.append_clones(parents[winners], targets[winners])
+        self.environment.place_rows(daughters)
+        self.update_frontier_rows(daughters)
+        self._cells_divided(parents[winners], daughters)
+        return daughters
+
+    # Plans the next tau_leap leap: its length in steps and the mutation chance of every cell, which is frozen for
+    # the whole leap. Freezing is what the leap gets wrong, a cell that mutates keeps its old chance until the leap
+    # ends. tau_epsilon bounds the leap (the leap condition of Cao, Gillespie & Petzold): the leap is the longest
+    # one, at most max_leap (and max_steps) steps, in which no cell expects more than tau_epsilon mutations. That
+    # bounds the fraction of every genotype that mutates within a leap and then runs on its frozen chance, whatever
+    # the genotype's size. It sets the leap length and so the speed; at the mutation rates of benchmark_tau_leaping
+    # the accuracy differences between epsilons stay below the sampling noise. At the default mutation chance (0.012)
+    # the default 0.3 allows leaps of 25 steps, so max_leap sets the leap. With max_leap=1 the results are exactly those
+    # of the vectorized engine.
+    def plan_leap(self, max_steps=None):
+        longest = self.max_leap if max_steps is None else min(self.max_leap, max_steps)
+        traits = self.cells.traits(slice(0, len(self.cells)))
+        mutation_chance = np.clip(traits[:, TRAIT_INDEX['mutation_rate']] * traits[:, TRAIT_INDEX['aggressiveness']], 0.0, 1.0)
+        highest = mutation_chance.max() if mutation_chance.size else 0.0
+        if highest <= 0:
+            return longest, mutation_chance
+        return int(min(longest, max(1, self.tau_epsilon / highest))), mutation_chance
+
+    # Tau-leaping for the bulk of the tumor: the mutations of the whole population are drawn once per leap as one
+    # binomial count per group (see leap_events) and applied at the step they fall on. Divisions only involve the
+    # frontier and depend on a geometry that changes every step, so they are still drawn step by step as in
+    # step_vectorized. Daughters born during the leap draw their own mutations for the steps left in it.
+    def step_tau_leap(self, steps, mutation_chance):
+        cells = self.cells
+        rng = self.rng
+        if steps == 1:
+            rows = np.flatnonzero(rng.random(mutation_chance.size) < mutation_chance)
+            offsets = np.zeros(rows.size, dtype=np.int64)
+        else:
+            rows, offsets = leap_events(chance_groups(mutation_chance), steps, rng)
+        step_starts = np.searchsorted(offsets, np.arange(steps + 1))
+        pending = [[rows[step_starts[offset]:step_starts[offset + 1]]] for offset in range(steps)]
+
+        for offset in range(steps):
+            cells.step = self.iteration_count - steps + offset + 1 # daughters are born at the step they fall on
+            aged_cells = len(cells)
+            mutating = np.concatenate(pending[offset])
+            if mutating.size:
+                self._cells_mutated(mutate_rows(cells, mutating, rng))
+            daughters = self.divide_frontier(aged_cells / self.environment.site_count()) if aged_cells else []
+            steps_left = steps - offset - 1
+            if steps_left and len(daughters):
+                traits = cells.traits(daughters)
+                mutation_chance = traits[:, TRAIT_INDEX['mutation_rate']] * traits[:, TRAIT_INDEX['aggressiveness']]
+                daughter, later = np.nonzero(rng.random((len(daughters), steps_left)) < mutation_chance[:, None])
+                for step_offset in np.unique(later):
+                    pending[offset + 1 + step_offset].append(daughters[daughter[later == step_offset]])
+            self._cells_aged(aged_cells)
+
+    # uniform draws for rows, options draws per row when given: counter-based with a seed (the values
+    # Cancer_Cell.uniform would draw), from self.rng otherwise
+    def _uniforms(self, rows, purpose, options=None):
+        if self.seed is None:
+            return self.rng.random(len(rows) if options is None else (len(rows), options))
+        return row_uniforms(self.cells, self.seed, self.iteration_count, rows, purpose, options)
+
+    # frontier rows (sorted) and their chance to divide this step, zero for cells with no free neighbor
+    # (ArrayEnvironment only)
+    def division_chances(self, global_tumor_fraction):
+        frontier = np.array(sorted(self.frontier), dtype=np.int64)
+        return frontier, frontier_division_chances(self.cells, self.environment, frontier, global_tumor_fraction)
+
+    # Continuous-time version of the same rules (Gillespie / next-reaction scheme). The per-step chances of the other
+    # engines are read as rates per unit of time, and every cell has one pending event in self.event_queue drawn from
+    # its division and mutation rates. Nothing is drawn for cells whose rates did not change: an event is only redrawn
+    # after the cell mutated or a neighboring site filled up. The global carrying capacity factor changes with every
+    # division, so divisions are scheduled without it and accepted with that probability when they fire (thinning).
+    # step() advances the clock by one unit of time, so history rows are sampled at integer times.
+    def step_gillespie(self):
+        cells = self.cells
+        queue = self.event_queue
+        self._schedule_new_rows()
+        end = self.iteration_count
+
+        while queue and queue[0][0] < end:
+            time, row, version = heapq.heappop(queue)
+            if version != self.event_versions[row]:
+                continue
+            self.time = time
+            cell = cells.view(row)
+            division_rate, mutation_rate = self._event_rates(cell)
+            if random.random() * (division_rate + mutation_rate) < mutation_rate:
+                if cell.add_random_mutation():
+                    self._cells_mutated([row])
+                self._schedule(row)
+                continue
+
+            global_tumor_fraction = len(cells) / self.environment.site_count()
+            global_effect = max(0.0, 1 - (global_tumor_fraction / CARRYING_CAPACITY))
+            local_effect = 1 - self.get_local_pressure(cell) * cell.pressure_sensitivity
+            accepted_rate = max(0.0, min(1.0, cell.proliferation_chance * local_effect * global_effect))
+            if random.random() * division_rate < accepted_rate and self.divide_cell(cell):
+                # the daughter and every cancer cell around it (the parent among them) lost a free neighbor
+                daughter = cells.view(len(cells) - 1)
+                self._schedule_new_rows()
+                for neighbor in self.environment.get_neighbors(*daughter.position):
+                    if neighbor.cell_type == 'cancer' and neighbor._store is cells:
+                        self._schedule(neighbor._index)
+            else:
+                self._schedule(row)
+
+        self.time = float(end)
+
+    # division rate (without the global factor, see step_gillespie) and mutation rate of a cell
+    def _event_rates(self, cell):
+        mutation_rate = 0.0
+        if cell.mutation_count < len(MUTATION_TYPES):
+            mutation_rate = max(0.0, min(1.0, cell.mutation_rate * cell.aggressiveness))
+        if cell._index not in self.frontier:
+            return 0.0, mutation_rate
+        local_effect = 1 - self.get_local_pressure(cell) * cell.pressure_sensitivity
+        return max(0.0, min(1.0, cell.proliferation_chance * local_effect)), mutation_rate
+
+    # replaces the pending event of row with a fresh one drawn at the current time
+    def _schedule(self, row):
+        self.event_versions[row] += 1
+        rate = sum(self._event_rates(self.cells.view(row)))
+        if rate > 0:
+            heapq.heappush(self.event_queue, (self.time + random.expovariate(rate), row, self.event_versions[row]))
+
+    # gives cells added since the last call (seeding, divisions) their first event
+    def _schedule_new_rows(self):
+        for row in range(len(self.event_versions), len(self.cells)):
+            self.event_versions.append(0)
+            self._schedule(row)
+
+    # keeps self.frontier current after a cell landed on site: that cell and its cancer neighbors are the only ones
+    # whose free neighbors changed
+    def update_frontier(self, *site):
+        open_rows, saturated_rows = self.environment.frontier_changes(site, self.cells)
+        self.frontier.difference_update(saturated_rows)
+        self.frontier.update(open_rows)
+
+    # update_frontier for a batch of freshly placed rows (ArrayEnvironment only)
+    def update_frontier_rows(self, rows):
+        environment = self.environment
+        neighbors = (environment.flat_index(self.cells.position[rows])[:, None] + environment.flat_offsets).ravel()
+        occupied = environment.flat_occupancy[neighbors] == 1
+        affected = np.unique(np.concatenate((rows, environment.flat_cell_index[neighbors][occupied])))
+        sites = environment.flat_index(self.cells.position[affected])
+        open_sites = (environment.flat_occupancy[sites[:, None] + environment.flat_offsets] == 0).any(axis=1)
+        self.frontier.difference_update(affected[~open_sites].tolist())
+        self.frontier.update(affected[open_sites].tolist())
 
 
     #this is used for crowding (higher pressure means more cancer cells around, less likely to divide)
     def get_local_pressure(self,cell):
-        neighbors = self.environment.get_neighbors(cell.position[0],cell.position[1])
-        total_neighbors = len(neighbors)
-        cancer_neighbors = 0.0
-        for c in neighbors:
-            if c.cell_type == 'cancer':
-                cancer_neighbors += 1.0
-
-        if total_neighbors == 0:
-            return 1.0
-
-        return cancer_neighbors/total_neighbors
+        return self.environment.local_pressure(*cell.position)
     
     # returns number of cancer neighbors at x,y position
     def cancer_neighbor_count(self,pos):
-        x,y = pos
-        neighbors = self.environment.get_neighbors(x,y)
-        total = 0
-        for c in neighbors:
-            if c.cell_type == 'cancer':
-                total += 1
-        return total
+        return self.environment.cancer_neighbor_count(*pos)
 
 
 
     #attempt to divide to neighboring spot, returns false if cant divide, otherwise chooses random available neighbor and creates identical cell there\
     #only cancer cells should call this function
     def divide_cell(self,cell):
-        x,y = cell.position
-        neighbors = self.environment.get_neighbors(cell.position[0],cell.position[1])
-        pressure = self.get_local_pressure(cell)
-        if pressure == 1.0:
-            return False
-        
-        # Find empty neighbor positions
-        available_positions = []
-        direction_map = [
-            (-1, 0), (-1, 1), (0, 1), (1, 1),
-            (1, 0), (1, -1), (0, -1), (-1, -1)
-        ]
-        for direction_x, direction_y in direction_map:
-            neighbor_x = direction_x + x
-            neighbor_y = direction_y + y
-                
-            if 0 <= neighbor_x < self.environment.width and 0 <= neighbor_y < self.environment.height:
-                if self.environment.grid[neighbor_y][neighbor_x].cell_type != 'cancer':
-                    available_positions.append((neighbor_x,neighbor_y))
-
-        if not available_positions:
+        new_position = self.choose_division_site(cell)
+        if new_position is None:
             return False
+        self.place_daughter(cell, new_position)
+        return True
+
+    # the empty neighbor a division of cell would claim on the current grid, None if there is none
+    def choose_division_site(self, cell):
+        position = cell.position
+        pressure = self.environment.local_pressure(*position)
+        if pressure == 1.0:
+            return None
 
         #prioritize gaps between cells instead of being fully random: prevents tumor for being spaced out too much
-        if random.random() < 0.8:
-            available_positions.sort(key=self.cancer_neighbor_count,reverse=True)
-            new_position = available_positions[0]
+        #the gap is the free site with the most cancer neighbors, the cell's own draws settle ties (see choose_division_sites)
+        #below full pressure some neighbor is empty, so the gap is drawn first and one scan finds the candidates
+        directions = self.environment.free_directions(position, cell.uniform(DRAW_GAP) < 0.8)
+        if not directions:
+            return None
+        if len(directions) == 1:
+            direction = directions[0]
         else:
-            new_position = random.choice(available_positions)
+            direction = directions[cell.pick(len(directions), DRAW_SITE, directions)]
+        return self.environment.neighbor_site(position, direction)
 
-        new_cell = cell.clone(new_position) #cancer cells only
-        self.environment.grid[new_position[1]][new_position[0]] = new_cell
-        self.cells.append(new_cell)
-
-        return True
+    # puts a daughter of cell (a row of self.cells) on the empty site new_position and returns the daughter's row
+    def place_daughter(self, cell, new_position):
+        row = self.cells.clone_row(cell._index, new_position) #cancer cells only
+        self.environment.place_row(self.cells, row, *new_position)
+        self.update_frontier(*new_position)
+        self._cells_divided([cell._index], [row])
+        return row
 
     # Returns a grid of mutation counts for current state
     def get_mutation_count_grid(self):
-        grid_data = np.zeros((self.environment.height, self.environment.width), dtype=int)
-        for y in range(self.environment.height):
-            for x in range(self.environment.width):
-                cell = self.environment.grid[y][x]
-                if cell.cell_type == 'cancer':
-                    grid_data[y][x] = cell.mutation_count
-        return grid_data
+        return self.environment.mutation_count_grid()
+
+    # Returns a grid of leading-subtype color indices for current state (see SUBTYPE_COLORS / custom_cmap)
+    def get_subtype_grid(self):
+        return self.environment.subtype_grid()
 
     #store current data on iteration as a dictionary (current idea) to be added to a df which can be converted to json for time series data
     def store_step(self):
-        data = {
-        'step': self.iteration_count,
-        'cancer_cell_count': len(self.cells),
-        'average_age': sum(cell.age for cell in self.cells) / len(self.cells) if self.cells else 0,
-        'average_mutations': sum(cell.mutation_count for cell in self.cells) / len(self.cells) if self.cells else 0
-    }
+        data = {'step': self.iteration_count}
+        for name, metric in self.metrics.items():
+            data[name] = metric.value(self)
         self.history.append(data)
 
     #next steps if time allows: treatment (bottleneck effect)
 
 
+# A value reported in every history row. Instead of scanning all cells each step, a metric keeps running totals
+# and is told about the only things that change them: new cells, mutations, and the end of a step. value() should
+# be O(1). Register new ones with Tumor.register_metric.
+class StepMetric():
+    name = None
+
+    # rebuild the running totals from the current cells
+    def reset(self, tumor):
+        pass
+
+    # rows were appended to tumor.cells
+    def on_cells_added(self, tumor, rows):
+        pass
+
+    # each of rows gained exactly one mutation
+    def on_mutations(self, tumor, rows):
+        pass
+
+    # a step finished, aged_cells cells got one step older
+    def on_step(self, tumor, aged_cells):
+        pass
+
+    def value(self, tumor):
+        raise NotImplementedError
+
+
+class CellCountMetric(StepMetric):
+    name = 'cancer_cell_count'
+
+    def value(self, tumor):
+        return len(tumor.cells)
+
+
+class AverageAgeMetric(StepMetric):
+    name = 'average_age'
+
+    # the total age is cells * current step - the sum of their birth steps, so ageing needs no bookkeeping
+    def reset(self, tumor):
+        self.total_birth = int(tumor.cells.birth[:len(tumor.cells)].sum())
+
+    def on_cells_added(self, tumor, rows):
+        if len(rows) == 1: # a single division, indexing the column directly is much cheaper than a gather
+            self.total_birth += int(tumor.cells.birth[rows[0]])
+        else:
+            self.total_birth += int(tumor.cells.birth[rows].sum())
+
+    def value(self, tumor):
+        cells = tumor.cells
+        return (len(cells) * cells.step - self.total_birth) / len(cells) if len(cells) else 0
+
+
+class AverageMutationsMetric(StepMetric):
+    name = 'average_mutations'
+
+    def reset(self, tumor):
+        self.total_mutations = int(popcount(tumor.cells.mutation_masks(slice(0, len(tumor.cells)))).sum())
+
+    def on_cells_added(self, tumor, rows):
+        if len(rows) == 1: # a single division, counted in plain python (see AverageAgeMetric)
+            self.total_mutations += bin(int(tumor.cells.genotype[rows[0]]) & ALL_MUTATIONS_MASK).count("1")
+        else:
+            self.total_mutations += int(popcount(tumor.cells.mutation_masks(rows)).sum())
+
+    def on_mutations(self, tumor, rows):
+        self.total_mutations += len(rows)
+
+    def value(self, tumor):
+        return self.total_mutations / len(tumor.cells) if len(tumor.cells) else 0
+
+
+# Ready-made observers (see Tumor.add_observer). A tumor with no observers does no per-step I/O at all.
+
+# appends a history row (Tumor.store_step) at the end of every step
+class HistoryObserver():
+    def on_step_end(self, tumor):
+        tumor.store_step()
+
+
+# keeps mutation count grids in tumor.mutation_frames for the animation
+class SnapshotObserver():
+    def on_snapshot(self, tumor, grid):
+        tumor.mutation_frames.append(grid)
+
+
+# prints the cell count, handy when debugging from the command line
+class PrintObserver():
+    def on_step_end(self, tumor):
+        print(f"Step {tumor.iteration_count}: {len(tumor.cells)} cancer cells")
+
+
+# cells are small and built often (views, normal tissue read off the grid), so they have no __dict__. __weakref__
+# lets the environments and stores hand them out through WeakValueDictionary caches
 class Cell():
+    __slots__ = ('position', 'age', 'cell_type', '__weakref__')
+
     def __init__(self,position):
         self.position = position
         self.age = 0
@@ -331,19 +1786,106 @@ class Cell():
 
     
 
+# attribute backed by one column of the cell's CellStore
+def _store_column(name, convert):
+    def getter(self):
+        return convert(getattr(self._store, name)[self._index])
+    def setter(self, value):
+        getattr(self._store, name)[self._index] = value
+    return property(getter, setter)
+
+# trait = founder value + genotype delta, setting it moves the cell to the founder that puts its current genotype on it
+def _trait_property(trait):
+    column = TRAIT_INDEX[trait]
+    def getter(self):
+        store = self._store
+        genotype = int(store.genotype[self._index])
+        mask = genotype & ALL_MUTATIONS_MASK
+        value = float(store.genotypes.founders[genotype >> GENOTYPE_SHIFT, column] + genotype_trait_table()[mask, column])
+        if trait == 'pressure_sensitivity':
+            value = max(0.0, value) #pressure sensitivity cant go below 0 that would mess up the program
+        return value
+    def setter(self, value):
+        store = self._store
+        genotype = int(store.genotype[self._index])
+        mask = genotype & ALL_MUTATIONS_MASK
+        founder = store.genotypes.founders[genotype >> GENOTYPE_SHIFT].copy()
+        founder[column] = value - genotype_trait_table()[mask, column]
+        store.set_genotype(self._index, store.genotypes.genotype(founder, mask))
+    return property(getter, setter)
+
+
+# A Cancer_Cell is a lightweight view onto one row of a CellStore. Cells that are not part of a tumor yet
+# get a private one-row store, so the attribute API is the same either way.
 class Cancer_Cell(Cell):
+    __slots__ = ('_store', '_index')
+
+    position = _store_column('position', lambda value: tuple(value.tolist()))
+    mutation_rate = _trait_property('mutation_rate')
+    proliferation_chance = _trait_property('proliferation_chance')
+    aggressiveness = _trait_property('aggressiveness')
+    resistance = _trait_property('resistance')
+    pressure_sensitivity = _trait_property('pressure_sensitivity')
+
     def __init__(self,position,mutation_rate =  0.01, proliferation_chance = 0.3,aggressiveness = 1.2):
+        self._store = CellStore(capacity=1, dimensions=len(position))
+        self._index = self._store.append_row()
+        # founder traits of a cell without mutations, registered once (see GenotypeRegistry)
+        founder = {
+            'proliferation_chance': proliferation_chance, # chance to divide during iteration
+            'mutation_rate': mutation_rate,
+            'resistance': 0, #TODO: implement treatment which can be negated through increased resistance
+            'aggressiveness': aggressiveness, #scaling function to be implemented
+            #add additional self.aggressiveness (this can be used to scale regular cells)
+            'pressure_sensitivity': 1.0, # how sensitive the cell is to crowding effects (when other cells are around it, it divides more than usual cells would)
+        }
+        genotype = self._store.genotypes.genotype([founder[trait] for trait in TRAIT_COLUMNS])
+        self._store.set_genotype(self._index, genotype, fresh=True)
         super().__init__(position)
-        self.mutations = set()
-        self.mutation_count = 0
-        self.mutation_rate = mutation_rate
-        self.proliferation_chance = proliferation_chance# chance to divide during iteration
         self.cell_type = 'cancer'
-        self.aggressiveness = aggressiveness #scaling function to be implemented
-        #add additional self.aggressiveness (this can be used to scale regular cells)
-        self.resistance = 0 #TODO: implement treatment which can be negated through increased resistance
-        self.subtype = [] # dynamically add subtypes based on whether certain metrics are reached
-        self.pressure_sensitivity = 1.0 # how sensitive the cell is to crowding effects (when other cells are around it, it divides more than usual cells would)
+
+    # view onto an existing row, skips __init__ so nothing is allocated besides the view itself
+    @classmethod
+    def from_row(cls, store, index):
+        cell = cls.__new__(cls)
+        cell._store = store
+        cell._index = index
+        cell.cell_type = 'cancer'
+        return cell
+
+    # subtype labels are only needed for rendering and statistics, so they are derived from the traits on read
+    @property
+    def subtype(self):
+        return classify_subtypes(tuple(self._store.traits(self._index).tolist()))
+
+    # mutations are stored as a bitmask over MUTATION_TYPES, this is a read-only copy of it as names
+    @property
+    def mutations(self):
+        mask = int(self._store.genotype[self._index]) & ALL_MUTATIONS_MASK
+        return frozenset(name for name in MUTATION_TYPES if mask & MUTATION_BITS[name])
+
+    # assigning a genotype directly keeps the current traits, only mutate() applies mutation effects
+    @mutations.setter
+    def mutations(self, mutations):
+        mask = 0
+        for name in mutations:
+            mask |= MUTATION_BITS[name]
+        store = self._store
+        founder = store.traits(self._index) - genotype_trait_table()[mask]
+        store.set_genotype(self._index, store.genotypes.genotype(founder, mask))
+
+    # steps since the cell was born (see CellStore.birth)
+    @property
+    def age(self):
+        return int(self._store.step - self._store.birth[self._index])
+
+    @age.setter
+    def age(self, age):
+        self._store.birth[self._index] = self._store.step - age
+
+    @property
+    def mutation_count(self):
+        return bin(int(self._store.genotype[self._index]) & ALL_MUTATIONS_MASK).count("1")
         
 
     #different grow function because cancer cells accumulate more mutations (tp53)
@@ -352,99 +1894,57 @@ class Cancer_Cell(Cell):
         self.mutate()
         return self
 
-    #determining what subtype the cell is based on whether or not it meets criteria -> prioritizes most relative deviation
+    # kept for older callers, subtypes are computed on read now
     def determine_subtypes(self):
-        self.subtype = []
-
-        # Calculate effect magnitudes
-        effect_proliferation = self.proliferation_chance - 0.3
-        effect_mutation = self.mutation_rate - 0.01
-        effect_resistance = self.resistance
-        effect_aggressive = self.aggressiveness - 1.2
-        effect_insensitive = 1.0 - self.pressure_sensitivity  # lower sensitivity = more insensitive
-
-        # Store (name, value) pairs
-        effects = [
-            ("Proliferative", effect_proliferation),
-            ("Mutator", effect_mutation),
-            ("Resistant", effect_resistance),
-            ("Aggressive", effect_aggressive),
-            ("Insensitive", effect_insensitive)
-        ]
-
-        # Manual insertion sort by effect strength (descending), only if above threshold
-        threshold = 0.01
-        sorted_effects = []
-
-        for name, value in effects:
-            if value > threshold:
-                inserted = False
-                for i in range(len(sorted_effects)):
-                    if value > sorted_effects[i][1]:
-                        sorted_effects.insert(i, (name, value))
-                        inserted = True
-                        break
-                if not inserted:
-                    sorted_effects.append((name, value))
-
-        if not sorted_effects:
-            self.subtype.append("Unclassified")
-        else:
-            for name, _ in sorted_effects:
-                self.subtype.append(name)
+        return self.subtype
+
+    # uniform draw for one decision of this cell: from the counter-based streams when its store has a seed (see
+    # counter_uniform), from the random module otherwise
+    def uniform(self, purpose, index=0):
+        store = self._store
+        if store.seed is None:
+            return random.random()
+        return counter_uniform(store.seed, store.step, site_key(*store.position[self._index].tolist()), purpose, index)
+
+    # index of the option picked uniformly among count options: with counter-based streams the option with the
+    # highest draw wins, which is what the array engines compute for a whole batch
+    def pick(self, count, purpose, options=None):
+        if self._store.seed is None:
+            return random.randrange(count)
+        options = range(count) if options is None else options
+        return max(range(count), key=lambda i: self.uniform(purpose, options[i]))
 
     def mutate(self):
-        if random.random() < self.mutation_rate * self.aggressiveness:
-            possible_mutations = list(set(MUTATION_TYPES) - self.mutations)
-            if possible_mutations:
-                new_mutation = random.choice(possible_mutations)
-                self.mutations.add(new_mutation)
-                self.mutation_count = len(self.mutations)
-                
-                #apply mutation effects to cell
-                effects = MUTATION_EFFECTS.get(new_mutation, {})
-                for attr, value in effects.items():
-                    if attr == 'proliferation_chance':
-                        self.proliferation_chance += value
-                    elif attr == 'mutation_rate':
-                        self.mutation_rate += value
-                    elif attr == 'resistance':
-                        self.resistance += value
-                    elif attr == 'aggressiveness':
-                        self.aggressiveness += value
-                    elif attr == 'pressure_sensitivity':
-                        self.pressure_sensitivity += value
-                        self.pressure_sensitivity = max(0.0, self.pressure_sensitivity) #pressure sensitivity cant go below 0 that would mess up the program
-
-                self.determine_subtypes() # recalculate subtypes
-                return True
+        if self.uniform(DRAW_MUTATION) < self.mutation_rate * self.aggressiveness:
+            return self.add_random_mutation()
         return False
 
+    # gains one mutation it does not carry yet, returns False when it already has all of them
+    def add_random_mutation(self):
+        genotype = int(self._store.genotype[self._index])
+        mask = genotype & ALL_MUTATIONS_MASK
+        if mask == ALL_MUTATIONS_MASK:
+            return False
+        if self._store.seed is None:
+            bit = random_unset_bit(mask)
+        else:
+            missing = [i for i in range(len(MUTATION_TYPES)) if not mask >> i & 1]
+            bit = 1 << missing[self.pick(len(missing), DRAW_GENE, missing)]
+        # traits follow from the genotype, nothing else to update
+        self._store.set_genotype(self._index, genotype | bit)
+        return True
+
     #checks if cell will divide, returns bool, takes into account pressure, which is calculated by the tumor class
     def should_divide(self, pressure=0.0, global_tumor_fraction=0.0):
-        local_effect = 1 - pressure * self.pressure_sensitivity
-        carrying_capacity = 0.3  # adjust as needed
-        global_effect = max(0.0, 1 - (global_tumor_fraction / carrying_capacity))
-        effective_chance = self.proliferation_chance * local_effect * global_effect
-        effective_chance = max(0.0, min(1.0, effective_chance))
-        return random.random() < effective_chance
+        effective_chance = division_chance(self.proliferation_chance, self.pressure_sensitivity, pressure, global_tumor_fraction)
+        return self.uniform(DRAW_DIVISION) < effective_chance
 
 
 
     #this function is useful because new cancer cells should be the same as the parent cells
+    #the clone is a new row of the cell's own store
     def clone(self, new_position):
-        clone = Cancer_Cell(
-            position=new_position,
-            mutation_rate=self.mutation_rate,
-            proliferation_chance=self.proliferation_chance,
-            aggressiveness=self.aggressiveness
-        )
-        clone.mutations = set(self.mutations)
-        clone.mutation_count = self.mutation_count
-        clone.resistance = self.resistance
-        clone.pressure_sensitivity = self.pressure_sensitivity
-        clone.subtype = list(self.subtype)
-        return clone
+        return self._store.append_clone(self, new_position)
 
 
     def __repr__(self):
@@ -453,6 +1953,421 @@ class Cancer_Cell(Cell):
 
     #next steps if time allows: resistance to treatment, metasticize
 
+
+# Struct-of-arrays storage for cancer cells: one numpy column per attribute, one row per cell.
+# Rows are never removed, so a row index doubles as a stable cell id. Capacity doubles when full,
+# which keeps appends amortized O(1). Cells keep the step they were born at, their age is read off self.step
+# (which the tumor moves on every step), so nobody writes to a cell just because it got older.
+class CellStore():
+    COLUMNS = {
+        'position': (np.int32, (2,)),
+        'birth': (np.int32, ()), # step the cell was born at, age = step - birth
+        'genotype': (np.int32, ()), # founder traits and mutation bitmask, see GenotypeRegistry
+    }
+
+    # dimensions is the length of a position, 3 for cells of an ArrayEnvironment3D
+    def __init__(self, capacity=64, dimensions=2):
+        self.capacity = max(1, capacity)
+        self.columns = dict(self.COLUMNS, position=(np.int32, (dimensions,)))
+        # seed and current step of the counter-based streams the cells draw from, None draws from the random module
+        self.seed = None
+        self.step = 0
+        self.clear()
+
+    def clear(self):
+        self.size = 0
+        self.genotypes = GenotypeRegistry()
+        for name, (dtype, shape) in self.columns.items():
+            setattr(self, name, self._empty_column(name, dtype, shape))
+        self.views = weakref.WeakValueDictionary() # live Cancer_Cell objects by row, so each row has one view at a time
+
+    def _empty_column(self, name, dtype, shape):
+        return np.zeros((self.capacity,) + shape, dtype=dtype)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.view(i) for i in range(*index.indices(self.size))]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("cell index out of range")
+        return self.view(index)
+
+    def __iter__(self):
+        for index in range(self.size):
+            yield self.view(index)
+
+    # Cancer_Cell object for a row, reusing the one already handed out if it is still alive
+    def view(self, index):
+        index = int(index)
+        cell = self.views.get(index)
+        if cell is None:
+            cell = Cancer_Cell.from_row(self, index)
+            self.views[index] = cell
+        return cell
+
+    def _grow(self, needed):
+        while self.capacity < needed:
+            self.capacity *= 2
+        for name, (dtype, shape) in self.columns.items():
+            old = getattr(self, name)
+            new = self._empty_column(name, dtype, shape)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    # reserves count zeroed rows and returns the index of the first one
+    def append_rows(self, count):
+        if self.size + count > self.capacity:
+            self._grow(self.size + count)
+        self.size += count
+        return self.size - count
+
+    def append_row(self):
+        return self.append_rows(1)
+
+    # ages of all rows (one per row of capacity, like the columns)
+    @property
+    def age(self):
+        return self.step - self.birth
+
+    # copies a row of source into the fresh row index, keeping its age and genotype
+    def copy_row(self, source, source_index, index):
+        for name in self.COLUMNS:
+            getattr(self, name)[index] = getattr(source, name)[source_index]
+        self.birth[index] += self.step - source.step
+        genotype = int(source.genotype[source_index])
+        if source.genotypes is not self.genotypes:
+            genotype = self.genotypes.genotype(source.genotypes.founders[genotype >> GENOTYPE_SHIFT], genotype & ALL_MUTATIONS_MASK)
+        self.set_genotype(index, genotype, fresh=True)
+
+    # mutation bitmasks of rows (mutations, the bitmasks of all rows, computes them for the whole store)
+    def mutation_masks(self, rows):
+        return self.genotype[rows] & ALL_MUTATIONS_MASK
+
+    @property
+    def mutations(self):
+        return self.mutation_masks(slice(None))
+
+    # moves row index to genotype, keeping the clone sizes current. A fresh row (see append_rows) has no genotype yet
+    def set_genotype(self, index, genotype, fresh=False):
+        if not fresh:
+            self.genotypes.add(int(self.genotype[index]), -1)
+        self.genotype[index] = genotype
+        self.genotypes.add(genotype, 1)
+
+    # set_genotype for arrays of rows and genotypes
+    def set_genotypes(self, rows, genotypes, fresh=False):
+        if not fresh:
+            self.genotypes.count(self.genotype[rows], -1)
+        self.genotype[rows] = genotypes
+        self.genotypes.count(self.genotype[rows], 1)
+
+    # moves a cell into this store, the cell object becomes a view onto its new row
+    def append(self, cell):
+        if cell._store is self:
+            return cell
+        index = self.append_row()
+        self.copy_row(cell._store, cell._index, index)
+        cell._store = self
+        cell._index = index
+        self.views[index] = cell
+        return cell
+
+    # appends a daughter of row parent at position and returns its row: same genotype, age 0
+    def clone_row(self, parent, position):
+        index = self.append_row()
+        genotype = int(self.genotype[parent])
+        self.genotype[index] = genotype
+        self.genotypes.add(genotype, 1)
+        self.position[index] = position
+        self.birth[index] = self.step
+        return index
+
+    # appends a daughter of cell at position: same traits and mutations, age 0
+    def append_clone(self, cell, position):
+        if cell._store is self:
+            return self.view(self.clone_row(cell._index, position))
+        index = self.append_row()
+        self.copy_row(cell._store, cell._index, index)
+        self.position[index] = position
+        self.birth[index] = self.step
+        return self.view(index)
+
+    # current traits of rows, one column per TRAIT_COLUMNS entry, gathered from genotype_trait_table
+    def traits(self, rows):
+        genotypes = self.genotype[rows]
+        traits = self.genotypes.founders[genotypes >> GENOTYPE_SHIFT] + genotype_trait_table()[genotypes & ALL_MUTATIONS_MASK]
+        pressure_sensitivity = traits[..., TRAIT_INDEX['pressure_sensitivity']]
+        np.maximum(pressure_sensitivity, 0.0, out=pressure_sensitivity)
+        return traits
+
+    # bulk append_clone: daughters of rows parents at positions, returns the new row indices
+    def append_clones(self, parents, positions):
+        start = self.append_rows(len(parents))
+        rows = np.arange(start, self.size)
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            column[rows] = column[parents]
+        self.position[rows] = positions
+        self.birth[rows] = self.step
+        self.genotypes.count(self.genotype[rows], 1)
+        return rows
+
+# CellStore with its columns in shared memory blocks (see SharedArrayEnvironment)
+class SharedCellStore(CellStore):
+    def __init__(self, shared, capacity=64, dimensions=2):
+        self.shared = shared
+        super().__init__(capacity, dimensions)
+
+    def _empty_column(self, name, dtype, shape):
+        return self.shared.zeros(name, (self.capacity,) + shape, dtype)
+
+# rows grouped by equal chance: (members, starts, sizes, chances) where the rows of group g are
+# members[starts[g]:starts[g] + sizes[g]] and all have chances[g]. Cells of one genotype share a group
+def chance_groups(chance):
+    members = np.argsort(chance)
+    ordered = chance[members]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]]) if chance.size else np.zeros(0, dtype=np.int64)
+    sizes = np.diff(np.r_[starts, chance.size])
+    return members, starts, sizes, ordered[starts]
+
+# Tau-leaping draw of the events of chance_groups over steps steps: each group gets one binomial count, spread over
+# its row-steps without replacement so no row gets two events in one step. Returns the rows and step offsets of the
+# events, ordered by offset
+def leap_events(groups, steps, rng):
+    members, starts, sizes, chances = groups
+    events = rng.binomial(sizes * steps, chances)
+    slots = [starts[g] * steps + rng.choice(sizes[g] * steps, events[g], replace=False) for g in np.flatnonzero(events)]
+    slots = np.concatenate(slots) if slots else np.zeros(0, dtype=np.int64)
+    offsets = slots % steps
+    order = np.argsort(offsets, kind='stable')
+    return members[slots[order] // steps], offsets[order]
+
+# steps until the first success of a per-step chance (at least 1), by inversion of one uniform per chance.
+# Chance 0 never succeeds (inf)
+def geometric_waits(chance, uniforms):
+    chance = np.clip(chance, 0.0, 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        waits = np.maximum(np.ceil(np.log1p(-uniforms) / np.log1p(-chance)), 1.0)
+    return np.where(chance > 0, waits, np.inf)
+
+# Pending mutations of rows as geometric waiting times: a row is scheduled with one draw for the step its per-step
+# chance first comes up (see geometric_waits) instead of one draw per step, and rescheduled once it mutated
+class MutationSchedule():
+    def __init__(self):
+        self.pending = {} # step -> arrays of the rows mutating at that step
+        self.rows = 0 # rows below this one have been scheduled
+
+    # schedules the next mutation of rows after step, uniforms holds one draw per row. Rows with chance 0 are not
+    # scheduled
+    def schedule(self, rows, chance, uniforms, step):
+        waits = geometric_waits(chance, uniforms)
+        due = waits < 2.0 ** 62 # anything later is never
+        rows, when = rows[due], step + waits[due].astype(np.int64)
+        order = np.argsort(when, kind='stable')
+        rows, when = rows[order], when[order]
+        starts = np.flatnonzero(np.r_[True, when[1:] != when[:-1]]) if when.size else np.zeros(0, dtype=np.int64)
+        for start, end in zip(starts.tolist(), np.r_[starts[1:], when.size].tolist()):
+            self.pending.setdefault(int(when[start]), []).append(rows[start:end])
+
+    # rows due to mutate at step (sorted), they are no longer scheduled
+    def pop(self, step):
+        due = self.pending.pop(step, None)
+        return np.sort(np.concatenate(due)) if due else np.zeros(0, dtype=np.int64)
+
+# gives each row one new mutation picked uniformly among the ones it does not have yet, rows with every
+# mutation are left alone. gene_draws holds one draw per row and gene (the missing gene with the highest one
+# is picked), rng provides them otherwise. Returns the rows that actually mutated
+def mutate_rows(cells, rows, rng, gene_draws=None):
+    keep = cells.mutation_masks(rows) != ALL_MUTATIONS_MASK
+    rows = rows[keep]
+    if rows.size == 0:
+        return rows
+    bit_values = np.array([MUTATION_BITS[name] for name in MUTATION_TYPES], dtype=np.int32)
+    genotypes = cells.genotype[rows]
+    missing = (genotypes[:, None] & bit_values) == 0
+    gene_draws = rng.random(missing.shape) if gene_draws is None else gene_draws[keep]
+    picked = np.where(missing, gene_draws, -1.0).argmax(axis=1)
+    cells.set_genotypes(rows, genotypes | bit_values[picked])
+    return rows
+
+
+# counter_uniforms of store rows at a step, keyed by their sites (what Tumor._uniforms draws with a seed)
+def row_uniforms(cells, seed, step, rows, purpose, options=None):
+    keys = site_keys(cells.position[rows])
+    if options is None:
+        return counter_uniforms(seed, step, keys, purpose)
+    return counter_uniforms(seed, step, keys[:, None], purpose, np.arange(options))
+
+# chance of frontier rows to divide this step, zero for cells with no free neighbor (ArrayEnvironment only)
+def frontier_division_chances(cells, environment, frontier, global_tumor_fraction):
+    sites = cells.position[frontier]
+    valid_neighbors = environment.valid_neighbor_count(*sites.T)
+    cancer_neighbors = environment.neighbor_count[environment.site_index(sites)]
+    pressure = np.where(valid_neighbors > 0, cancer_neighbors / np.maximum(valid_neighbors, 1), 1.0)
+    traits = cells.traits(frontier)
+    local_effect = 1 - pressure * traits[:, TRAIT_INDEX['pressure_sensitivity']]
+    global_effect = max(0.0, 1 - (global_tumor_fraction / CARRYING_CAPACITY))
+    effective_chance = np.clip(traits[:, TRAIT_INDEX['proliferation_chance']] * local_effect * global_effect, 0.0, 1.0)
+    return np.where(pressure < 1.0, effective_chance, 0.0)
+
+# Draws which frontier rows divide and the empty site each one claims against the current grid, the way divide_cell
+# picks it. draws(rows, purpose, options=None) provides the uniform draws (see Tumor._uniforms). Two parents may
+# claim the same site, priority settles it (see winning_proposals). Returns (parents, targets, priority) with one
+# target site per row of targets
+def propose_divisions(cells, environment, frontier, chance, draws):
+    dividing = np.flatnonzero(draws(frontier, DRAW_DIVISION) < chance)
+    if dividing.size == 0:
+        return frontier[dividing], np.zeros((0, len(environment.shape)), dtype=np.int64), np.zeros(0)
+
+    # candidate sites in neighbor_offsets order, like divide_cell scans them (the border is never free)
+    sites = cells.position[frontier[dividing]]
+    candidates = environment.flat_index(sites)[:, None] + environment.flat_offsets
+    free = environment.flat_occupancy[candidates] == 0
+
+    site_draws = draws(frontier[dividing], DRAW_SITE, free.shape[1])
+    prefer_gaps = draws(frontier[dividing], DRAW_GAP) < 0.8
+    choice = choose_division_sites(free, environment.flat_neighbor_count[candidates], site_draws, prefer_gaps)
+    has_site = free.any(axis=1)
+    parents = frontier[dividing[has_site]]
+    targets = sites[has_site] + environment.neighbor_offsets[choice[has_site]]
+    return parents, targets, draws(parents, DRAW_PRIORITY)
+
+# Batch form of the site choice of divide_cell, one row per dividing cell and one column per candidate site: where
+# prefer_gaps, the free site with the most cancer neighbors (gaps), otherwise any free site. Among the eligible sites
+# the one with the largest site draw wins, so ties between equal gaps are settled by the cell's own draws.
+# Returns the column of the chosen site, rows without a free site get 0
+def choose_division_sites(free, gaps, site_draws, prefer_gaps):
+    gap_score = np.where(free, gaps, -1)
+    best_gaps = free & (gap_score == gap_score.max(axis=1, keepdims=True))
+    eligible = np.where(prefer_gaps[:, None], best_gaps, free)
+    return np.where(eligible, site_draws, -1.0).argmax(axis=1)
+
+# conflict resolution between division proposals: the lowest priority claims the site. Returns the indices of the
+# winning proposals, ordered by target site
+def winning_proposals(environment, targets, priority):
+    sites = environment.flat_index(targets)
+    order = np.lexsort((priority, sites))
+    sorted_sites = sites[order]
+    return order[np.r_[True, sorted_sites[1:] != sorted_sites[:-1]]]
+
+# One 'parallel' step of the rows start:end of the grid: mutates the cells there and proposes their
+# divisions (see propose_divisions) with counter-based draws, exactly what step_vectorized does for them. Divisions in
+# the first and last rows look at the rows of the neighboring bands (the halo) straight in shared memory. Nothing but
+# the cells of the band is written, the grid only changes when the coordinator places the daughters.
+# Returns the rows that mutated, their genotypes before and the division proposals
+def step_tile(environment, strip, seed, step):
+    cells = environment.store
+    start, end = strip
+    first, last = (start + 1) * environment._site_strides[1], (end + 1) * environment._site_strides[1]
+    sites = first + np.flatnonzero(environment.flat_occupancy[first:last] == 1) # row-major within the band
+    rows = environment.flat_cell_index[sites].astype(np.int64)
+
+    traits = cells.traits(rows)
+    mutation_chance = traits[:, TRAIT_INDEX['mutation_rate']] * traits[:, TRAIT_INDEX['aggressiveness']]
+    mutating = rows[row_uniforms(cells, seed, step, rows, DRAW_MUTATION) < mutation_chance]
+    previous = cells.genotype[mutating]
+    mutated = mutate_rows(cells, mutating, None, row_uniforms(cells, seed, step, mutating, DRAW_GENE, len(MUTATION_TYPES)))
+    previous = previous[cells.genotype[mutating] != previous]
+
+    # cells with a free neighbor, only sites with less than 8 cancer neighbors need the neighbor scan
+    open_sites = np.flatnonzero(environment.flat_neighbor_count[sites] < len(environment.flat_offsets))
+    free = environment.flat_occupancy[sites[open_sites][:, None] + environment.flat_offsets] == 0
+    frontier = rows[open_sites[free.any(axis=1)]]
+    global_tumor_fraction = len(cells) / environment.site_count()
+    chance = frontier_division_chances(cells, environment, frontier, global_tumor_fraction)
+    draws = functools.partial(row_uniforms, cells, seed, step)
+    return mutated, previous, propose_divisions(cells, environment, frontier, chance, draws)
+
+# maps a block created by the coordinator. The coordinator unlinks its blocks itself: from Python 3.13 on workers
+# skip the resource tracker, before that they share the coordinator's tracker (it started with the first block,
+# before any worker), where registering a block again changes nothing
+def _attach_block(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+# arrays of the blocks in specs, attached caches the arrays of the blocks this worker mapped so far by block name
+def _attach_arrays(specs, attached):
+    current = {name for name, shape, dtype in specs.values()}
+    for name in set(attached) - current:
+        del attached[name]
+    for name, shape, dtype in specs.values():
+        if name not in attached:
+            attached[name] = shared_array(_attach_block(name), shape, dtype)
+    return {key: attached[name] for key, (name, shape, dtype) in specs.items()}
+
+# worker process of TileWorkers: steps the band it is sent until it gets None, errors are sent back
+def _tile_worker(connection):
+    attached = {}
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        specs, width, height, size, founders, strip, seed, step = message
+        try:
+            environment = SharedArrayEnvironment.attach(width, height, _attach_arrays(specs, attached), size, founders)
+            reply = step_tile(environment, strip, seed, step)
+        except Exception as error:
+            reply = error
+        environment = None
+        connection.send(reply)
+    connection.close()
+
+def _stop_workers(connections, processes):
+    for connection in connections:
+        try:
+            connection.send(None)
+            connection.close()
+        except OSError:
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+
+# Worker processes of the 'parallel' engine, one per band of rows of a SharedArrayEnvironment (see strips). Grid and
+# cells stay in shared memory, the pipes only carry block names going out and mutated rows and division proposals
+# coming back. Block names are sent every step, so workers follow the store when it grows
+class TileWorkers():
+    def __init__(self, environment, count):
+        context = multiprocessing.get_context()
+        self.strips = environment.strips(count)
+        self.connections = []
+        self.processes = []
+        for _ in self.strips:
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_tile_worker, args=(worker_connection,), daemon=True)
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        self._stop = weakref.finalize(self, _stop_workers, self.connections, self.processes)
+
+    # steps every band, returns the rows that mutated (sorted), their genotypes before and the division proposals of
+    # all bands
+    def step(self, environment, seed, step):
+        store = environment.store
+        shared = (environment.shared.specs(), environment.width, environment.height, len(store), store.genotypes.founders)
+        for connection, strip in zip(self.connections, self.strips):
+            connection.send(shared + (strip, seed, step))
+        replies = [connection.recv() for connection in self.connections]
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        mutated = np.concatenate([mutated for mutated, previous, proposals in replies])
+        previous = np.concatenate([previous for mutated, previous, proposals in replies])
+        order = np.argsort(mutated)
+        proposals = [np.concatenate(columns) for columns in zip(*(proposals for mutated, previous, proposals in replies))]
+        return mutated[order], previous[order], proposals
+
+    def close(self):
+        self._stop()
+
+
 # web service
 app = Flask(__name__)
 
@@ -470,9 +2385,11 @@ def index():
         aggressiveness = float(request.form["aggressiveness"])
 
         # -- Run simulation --
-        env = Environment(width, height)
+        env = ArrayEnvironment(width, height)
         env.initialize_grid()
         tumor = Tumor(env)
+        tumor.add_observer(HistoryObserver())
+        tumor.add_observer(SnapshotObserver())
         tumor.seed_initial_cancer(Cancer_Cell(
             position=(width//2, height//2),
             mutation_rate=mutation_rate,
@@ -520,7 +2437,7 @@ def index():
 
             def animate(i):
                 img.set_array(tumor.mutation_frames[i])
-                ax.set_title(f"Mutation Count – Step {i * 10}")
+                ax.set_title(f"Mutation Count – Step {(i + 1) * ANIMATION_INTERVAL}")
                 return [img]
 
             ani = animation.FuncAnimation(
@@ -601,6 +2518,7 @@ if __name__ == "__main__":
 
         parser.add_argument('-W', '--width', type = int, default = 100, help = 'Width of cell matrix')
         parser.add_argument('-H', '--height', type = int, default = 100, help = 'Height of cell matrix')
+        parser.add_argument('-D', '--depth', type = int, default = None, help = 'Depth of cell matrix, grows a 3D spheroid (array backend only, snapshots are projections along the depth)')
         parser.add_argument('-S', '--steps', type = int, default = 50, help = 'Number of simulation iterations to run (50 default)')
         # Mutation rate override
         parser.add_argument('--mutation_rate', type=float, default=0.01, help='Mutation rate of cancer cells (default: 0.01)')
@@ -610,26 +2528,55 @@ if __name__ == "__main__":
         parser.add_argument('--aggressiveness', type=float, default=1.2, help='Aggressiveness multiplier for mutation/division (default: 1.2)')
         # Manual Random Seed
         parser.add_argument('--seed', type=int, default=42,help='Random seed for reproducibility')
+        # Grid storage backend
+        parser.add_argument('--backend', choices=['array', 'list'], default='array', help='Grid storage: numpy arrays (default) or the reference list of Cell objects')
+        # Stepping engine
+        parser.add_argument('--engine', choices=ENGINES, default='reference', help='Stepping engine: cell by cell reference loop (default), whole-population array operations, continuous-time events, tau-leaping or array operations split over worker processes')
+        # Tau-leaping error control
+        parser.add_argument('--tau_epsilon', type=float, default=0.3, help='Most mutations a cell may expect within one tau_leap leap, sets the leap length and speed (default: 0.3). History gets one row per leap')
+        # Worker processes of the parallel engine
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes of the parallel engine (default: one per CPU)')
+        # Synchronous updates of the reference engine
+        parser.add_argument('--synchronous', action='store_true', help='Reference engine only: every cell reads the start-of-step grid and divisions are placed at the end of the step')
+        # Mutations as geometric waiting times
+        parser.add_argument('--scheduled_mutations', action='store_true', help='Draw the step of each cell\'s next mutation once instead of a draw per cell and step (reference and vectorized engines)')
 
         args = parser.parse_args()
+        if args.synchronous and args.engine != 'reference':
+            parser.error('--synchronous is an option of the reference engine')
+        if args.scheduled_mutations and args.engine not in SCHEDULED_MUTATION_ENGINES:
+            parser.error('--scheduled_mutations needs the reference or vectorized engine')
+        if args.depth is not None and (args.backend == 'list' or args.engine == 'parallel'):
+            parser.error('--depth needs the array backend and an engine other than parallel')
 
         random.seed(args.seed)
         np.random.seed(args.seed)   
 
-        middle_position = (args.width // 2, args.height // 2)
-
-        env = Environment(args.width,args.height)
-        tumor = Tumor(env)
+        if args.depth is not None:
+            env = ArrayEnvironment3D(args.width,args.height,args.depth)
+        elif args.backend == 'list':
+            env = Environment(args.width,args.height)
+        elif args.engine == 'parallel':
+            env = SharedArrayEnvironment(args.width,args.height)
+        else:
+            env = ArrayEnvironment(args.width,args.height)
+        # counter-based streams make the run depend on --seed only, not on the order cells are visited in
+        tumor = Tumor(env, engine=args.engine, tau_epsilon=args.tau_epsilon, workers=args.workers,
+                      seed=args.seed if args.engine in SEEDED_ENGINES else None,
+                      scheduled_mutations=args.scheduled_mutations, synchronous=args.synchronous)
         tumor.environment.initialize_grid()
+        tumor.add_observer(HistoryObserver())
+        tumor.add_observer(SnapshotObserver())
+        tumor.add_observer(PrintObserver())
 
-        tumor.seed_initial_cancer(Cancer_Cell(position = middle_position, mutation_rate=args.mutation_rate,proliferation_chance=args.proliferation,aggressiveness=args.aggressiveness))
+        tumor.seed_initial_cancer(Cancer_Cell(position = env.center(), mutation_rate=args.mutation_rate,proliferation_chance=args.proliferation,aggressiveness=args.aggressiveness))
 
 
-        for i in range(args.steps):
-            tumor.step()
-            #store_step()
+        tumor.run(args.steps)
+        tumor.close()
 
         tumor.environment.visualize()
+        tumor.environment.visualize_subtypes()
 
         # Create and save animation of mutation count over time
         if tumor.mutation_frames:
@@ -640,7 +2587,7 @@ if __name__ == "__main__":
             def animate(i):
                 ax.clear()
                 img = ax.imshow(tumor.mutation_frames[i], cmap=cmap, norm=norm)
-                ax.set_title(f"Mutation Count – Step {i * 10}")
+                ax.set_title(f"Mutation Count – Step {(i + 1) * ANIMATION_INTERVAL}")
                 return [img]
 
             ani = animation.FuncAnimation(
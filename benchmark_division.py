@@ -0,0 +1,87 @@
+import argparse
+import random
+import time
+import tracemalloc
+import numpy as np
+import TumorSimV7 as v7
+import TumorSimV8 as v8
+
+# Memory traffic of a single divide_cell call, TumorSimV7 against TumorSimV8 on both backends. A tumor grows from
+# one cell by dividing random cells, and every successful division is measured on its own with tracemalloc: the
+# peak of traced memory above the start of the call (scratch lists, sites, the daughter) and what is still held
+# when it returns (the daughter, the grid entry and its share of the growing cell storage, averaged over all
+# divisions). Attempts that find no empty neighbor are not counted. Timings are the median of the same divisions
+# in a separate run without tracing.
+
+# --- Benchmark settings ---
+SEED = 3
+
+
+def new_tumor(module, backend, size):
+    env = backend(size, size)
+    env.initialize_grid()
+    tumor = module.Tumor(env)
+    tumor.seed_initial_cancer()
+    tumor.cells[0].proliferation_chance = 1.0
+    return tumor
+
+
+# divides random cells until divisions cells were added, measure(tumor, cell) makes one division attempt
+def grow(tumor, divisions, measure):
+    random.seed(SEED)
+    added = 0
+    while added < divisions:
+        cell = tumor.cells[random.randrange(len(tumor.cells))]
+        added += measure(tumor, cell)
+
+
+def trace_divisions(module, backend, size, divisions):
+    tumor = new_tumor(module, backend, size)
+    peaks = []
+    kept = []
+
+    def measure(tumor, cell):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        divided = tumor.divide_cell(cell)
+        current, peak = tracemalloc.get_traced_memory()
+        if divided:
+            peaks.append(peak - before)
+            kept.append(current - before)
+        return divided
+
+    tracemalloc.start()
+    grow(tumor, divisions, measure)
+    tracemalloc.stop()
+    return np.median(peaks), np.mean(kept)
+
+
+def time_divisions(module, backend, size, divisions):
+    tumor = new_tumor(module, backend, size)
+    seconds = []
+
+    def measure(tumor, cell):
+        start = time.perf_counter()
+        divided = tumor.divide_cell(cell)
+        if divided:
+            seconds.append(time.perf_counter() - start)
+        return divided
+
+    grow(tumor, divisions, measure)
+    return np.median(seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Allocations per division")
+    parser.add_argument("--size", type=int, default=200, help="grid size")
+    parser.add_argument("--divisions", type=int, default=2000, help="divisions per run")
+    args = parser.parse_args()
+
+    settings = [("V7", v7, v7.Environment, "list"), ("V8", v8, v8.Environment, "list"),
+                ("V8", v8, v8.ArrayEnvironment, "array")]
+    print(f"{args.divisions} divisions on {args.size}x{args.size}, bytes per division")
+    print(f"{'version':>8} {'backend':>8} {'peak (median)':>14} {'kept (mean)':>12} {'us/division':>12}")
+    for version, module, backend, name in settings:
+        peak, kept = trace_divisions(module, backend, args.size, args.divisions)
+        seconds = time_divisions(module, backend, args.size, args.divisions)
+        print(f"{version:>8} {name:>8} {peak:14.0f} {kept:12.0f} {seconds * 1e6:12.1f}")
@@ -0,0 +1,50 @@
+import argparse
+import os
+import time
+import numpy as np
+from TumorSimV8 import ArrayEnvironment, SharedArrayEnvironment, Tumor
+from benchmark_tau_leaping import fill_disc
+
+# Scaling of the parallel engine with the number of worker processes, against the single-process vectorized engine
+# it reproduces bit-for-bit. Every run starts from the same tumor pre-filled with a disc over a quarter of the grid,
+# and the final cell counts are printed as a check that all runs simulated the same thing.
+# Any speedup depends on the machine: workers only pay off with as many free cores as workers (the CPU count is
+# printed with the results). With fewer cores the pipes and the coordinator's work are pure overhead, on a single
+# CPU the parallel engine runs at roughly 0.3-0.8x the vectorized engine.
+
+# --- Benchmark settings ---
+SEED = 1
+
+
+# same start as the tau_leap speed runs (see benchmark_tau_leaping.fill_disc), a disc over a quarter of the grid
+def filled_tumor(engine, size, workers=None):
+    env = SharedArrayEnvironment(size, size) if engine == 'parallel' else ArrayEnvironment(size, size)
+    return fill_disc(Tumor(env, engine=engine, seed=SEED, workers=workers), int(np.sqrt(0.25 * size ** 2 / np.pi)))
+
+
+# seconds per step, the first step (starting the workers) is not timed
+def time_steps(engine, size, steps, workers=None):
+    tumor = filled_tumor(engine, size, workers)
+    tumor.step()
+    start = time.perf_counter()
+    for _ in range(steps):
+        tumor.step()
+    seconds = (time.perf_counter() - start) / steps
+    tumor.close()
+    return seconds, len(tumor.cells)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel engine scaling benchmark")
+    parser.add_argument("--size", type=int, default=4000, help="grid size")
+    parser.add_argument("--steps", type=int, default=10, help="timed steps per run")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="worker counts to time")
+    args = parser.parse_args()
+
+    print(f"{args.steps} steps on {args.size}x{args.size} starting from a filled disc, {os.cpu_count()} CPUs")
+    print(f"{'engine':>10} {'workers':>8} {'ms/step':>8} {'speedup':>8} {'cells':>10}")
+    baseline, cells = time_steps('vectorized', args.size, args.steps)
+    print(f"{'vectorized':>10} {'-':>8} {baseline * 1000:8.1f} {1.0:8.2f} {cells:10d}")
+    for workers in args.workers:
+        seconds, cells = time_steps('parallel', args.size, args.steps, workers)
+        print(f"{'parallel':>10} {workers:>8} {seconds * 1000:8.1f} {baseline / seconds:8.2f} {cells:10d}")
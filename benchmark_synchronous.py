@@ -0,0 +1,63 @@
+import argparse
+import time
+import numpy as np
+from TumorSimV8 import ArrayEnvironment, Tumor, HistoryObserver, Cancer_Cell
+
+# How far synchronous updates (every cell reads the start-of-step grid, divisions are placed at the end of the
+# step) move the growth curves away from the asynchronous reference engine, where each division lands right away.
+# Mean curves (history) from a single seeded cell are compared against asynchronous runs on other seeds, and an
+# asynchronous curve on yet other seeds gives the sampling noise of the comparison. Errors are taken once the tumor
+# has at least MIN_CELLS cells: the largest relative difference of the mean cell count and the largest difference
+# of the mean number of mutations per cell. The vectorized engine implements the synchronous rule, it is listed
+# for its speed.
+
+# --- Benchmark settings ---
+MUTATION_RATE = 0.005
+PROLIFERATION_CHANCE = 0.6
+MIN_CELLS = 100
+CHECKPOINTS = 5
+
+
+def run_curves(engine, synchronous, size, steps, repeats, first_seed=0):
+    counts = []
+    mutations = []
+    start = time.perf_counter()
+    for seed in range(first_seed, first_seed + repeats):
+        env = ArrayEnvironment(size, size)
+        tumor = Tumor(env, engine=engine, seed=seed, synchronous=synchronous)
+        tumor.add_observer(HistoryObserver())
+        tumor.seed_initial_cancer(Cancer_Cell(
+            position=(size // 2, size // 2),
+            mutation_rate=MUTATION_RATE,
+            proliferation_chance=PROLIFERATION_CHANCE
+        ))
+        for _ in range(steps):
+            tumor.step()
+        counts.append([row['cancer_cell_count'] for row in tumor.history])
+        mutations.append([row['average_mutations'] for row in tumor.history])
+    return np.mean(counts, axis=0), np.mean(mutations, axis=0), time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synchronous vs asynchronous update divergence")
+    parser.add_argument("--size", type=int, default=120, help="grid size")
+    parser.add_argument("--steps", type=int, default=80, help="steps per run")
+    parser.add_argument("--repeats", type=int, default=10, help="seeds averaged per curve")
+    args = parser.parse_args()
+
+    print(f"{args.repeats} runs of {args.steps} steps on {args.size}x{args.size}, errors against asynchronous updates")
+    exact_counts, exact_mutations, _ = run_curves("reference", False, args.size, args.steps, args.repeats)
+    compared = exact_counts >= MIN_CELLS
+    settings = [("reference", False, "asynchronous"), ("reference", True, "synchronous"), ("vectorized", False, "synchronous")]
+    checkpoints = np.linspace(0, args.steps - 1, CHECKPOINTS + 1).astype(int)[1:]
+
+    print(f"{'engine':>10} {'updates':>12} {'seconds':>8} " + " ".join(f"{f'step {step + 1}':>9}" for step in checkpoints)
+          + f" {'cells error':>12} {'mutations error':>16}")
+    print(f"{'baseline':>10} {'asynchronous':>12} {'-':>8} " + " ".join(f"{exact_counts[step]:9.0f}" for step in checkpoints))
+    for index, (engine, synchronous, updates) in enumerate(settings, start=1):
+        counts, mutations, seconds = run_curves(engine, synchronous, args.size, args.steps, args.repeats,
+                                                index * args.repeats)
+        count_error = np.max(np.abs(counts - exact_counts)[compared] / exact_counts[compared])
+        mutation_error = np.max(np.abs(mutations - exact_mutations)[compared])
+        print(f"{engine:>10} {updates:>12} {seconds:8.2f} " + " ".join(f"{counts[step]:9.0f}" for step in checkpoints)
+              + f" {count_error:12.1%} {mutation_error:16.3f}")
@@ -0,0 +1,106 @@
+import argparse
+import random
+import time
+import numpy as np
+from TumorSimV8 import ArrayEnvironment, Tumor, HistoryObserver, Cancer_Cell
+
+# Speed/accuracy trade-off of the tau_leap engine against exact stepping.
+#
+# Accuracy: mean growth curves (history) from a single seeded cell, each tau_epsilon against the vectorized engine,
+# which steps the same synchronous rules exactly (the reference engine is listed too, for scale). Every setting runs
+# on other seeds than the exact curve, so the vectorized row shows the sampling noise of the comparison. Leaps skip
+# history rows, so curves are interpolated to integer steps, and errors are taken once the tumor has at least
+# MIN_CELLS cells: the largest relative difference of the mean cell count and the largest difference of the
+# mean number of mutations per cell.
+# Speed: seconds per simulated step on a tumor pre-filled to about 10^6 cells, where the bulk of the population
+# (ageing and mutation draws) dominates and leaping pays off.
+
+# --- Benchmark settings ---
+EPSILONS = [0.03, 0.1, 0.3, 1.0]
+MAX_LEAP = 20
+MUTATION_RATE = 0.005
+PROLIFERATION_CHANCE = 0.6
+MIN_CELLS = 100
+
+
+def run_curves(engine, tau_epsilon, size, steps, repeats, first_seed=0):
+    counts = []
+    mutations = []
+    start = time.perf_counter()
+    for seed in range(first_seed, first_seed + repeats):
+        random.seed(seed)
+        env = ArrayEnvironment(size, size)
+        env.initialize_grid()
+        tumor = Tumor(env, engine=engine, tau_epsilon=tau_epsilon, max_leap=MAX_LEAP)
+        tumor.add_observer(HistoryObserver())
+        tumor.seed_initial_cancer(Cancer_Cell(
+            position=(size // 2, size // 2),
+            mutation_rate=MUTATION_RATE,
+            proliferation_chance=PROLIFERATION_CHANCE
+        ))
+        tumor.run(steps)
+
+        recorded = [row['step'] for row in tumor.history]
+        counts.append(np.interp(np.arange(1, steps + 1), recorded, [row['cancer_cell_count'] for row in tumor.history]))
+        mutations.append(np.interp(np.arange(1, steps + 1), recorded, [row['average_mutations'] for row in tumor.history]))
+    return np.mean(counts, axis=0), np.mean(mutations, axis=0), time.perf_counter() - start
+
+
+# seeds the founder in the middle of tumor's (empty, square) grid and fills a disc of radius around it with its
+# clones, so speed runs start at full size without growing the tumor first
+def fill_disc(tumor, radius):
+    size = tumor.environment.width
+    center = size // 2
+    tumor.seed_initial_cancer(Cancer_Cell(
+        position=(center, center),
+        mutation_rate=MUTATION_RATE,
+        proliferation_chance=PROLIFERATION_CHANCE
+    ))
+    ys, xs = np.nonzero((np.arange(size)[:, None] - center) ** 2 + (np.arange(size)[None, :] - center) ** 2 < radius ** 2)
+    others = (xs != center) | (ys != center)
+    tumor.place_clones(np.zeros(others.sum(), dtype=np.int64), np.column_stack((xs[others], ys[others])))
+    return tumor
+
+
+def filled_tumor(engine, tau_epsilon, size, radius):
+    random.seed(0)
+    env = ArrayEnvironment(size, size)
+    env.initialize_grid()
+    return fill_disc(Tumor(env, engine=engine, tau_epsilon=tau_epsilon, max_leap=MAX_LEAP), radius)
+
+
+def time_steps(engine, tau_epsilon, size, radius, steps):
+    tumor = filled_tumor(engine, tau_epsilon, size, radius)
+    start = time.perf_counter()
+    tumor.run(steps)
+    return (time.perf_counter() - start) / tumor.iteration_count, len(tumor.cells)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tau-leaping speed/accuracy benchmark")
+    parser.add_argument("--size", type=int, default=120, help="grid size of the accuracy runs")
+    parser.add_argument("--steps", type=int, default=120, help="steps of the accuracy runs")
+    parser.add_argument("--repeats", type=int, default=10, help="seeds averaged per accuracy curve")
+    parser.add_argument("--large-size", type=int, default=2000, help="grid size of the speed runs")
+    parser.add_argument("--large-steps", type=int, default=40, help="steps of the speed runs")
+    args = parser.parse_args()
+
+    settings = [("reference", None), ("vectorized", None)] + [("tau_leap", epsilon) for epsilon in EPSILONS]
+
+    print(f"Accuracy: {args.repeats} runs of {args.steps} steps on {args.size}x{args.size}, "
+          f"errors against the vectorized engine")
+    exact_counts, exact_mutations, _ = run_curves("vectorized", 0.03, args.size, args.steps, args.repeats)
+    compared = exact_counts >= MIN_CELLS
+    print(f"{'engine':>10} {'epsilon':>8} {'seconds':>8} {'final cells':>12} {'cells error':>12} {'mutations error':>16}")
+    for engine, epsilon in settings:
+        counts, mutations, seconds = run_curves(engine, epsilon or 0.03, args.size, args.steps, args.repeats, args.repeats)
+        count_error = np.max(np.abs(counts - exact_counts)[compared] / exact_counts[compared])
+        mutation_error = np.max(np.abs(mutations - exact_mutations)[compared])
+        print(f"{engine:>10} {epsilon or '-':>8} {seconds:8.2f} {counts[-1]:12.0f} {count_error:12.1%} {mutation_error:16.3f}")
+
+    radius = int(np.sqrt(0.25 * args.large_size ** 2 / np.pi)) # a quarter of the grid, below the carrying capacity
+    print(f"\nSpeed: {args.large_steps} steps on {args.large_size}x{args.large_size} starting from a filled disc")
+    print(f"{'engine':>10} {'epsilon':>8} {'ms/step':>8} {'cells':>10}")
+    for engine, epsilon in settings[1:]:
+        seconds, cells = time_steps(engine, epsilon or 0.03, args.large_size, radius, args.large_steps)
+        print(f"{engine:>10} {epsilon or '-':>8} {seconds * 1000:8.1f} {cells:10d}")
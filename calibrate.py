@@ -8,13 +8,14 @@ import os
 
 # --- Dynamically import TumorSimV8 ---
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from TumorSimV8 import Environment, Tumor, Cancer_Cell
+from TumorSimV8 import ArrayEnvironment, Tumor, HistoryObserver, Cancer_Cell
 
 
-def run_simulation(mutation_rate, proliferation, aggressiveness, steps=100):
-    env = Environment(width=20, height=20)
+def run_simulation(mutation_rate, proliferation, aggressiveness, steps=100, engine='reference'):
+    env = ArrayEnvironment(width=20, height=20)
     env.initialize_grid()
-    tumor = Tumor(env)
+    tumor = Tumor(env, engine=engine)
+    tumor.add_observer(HistoryObserver())
     tumor.seed_initial_cancer(Cancer_Cell(
         position=(10, 10),
         mutation_rate=mutation_rate,
@@ -22,10 +23,11 @@ def run_simulation(mutation_rate, proliferation, aggressiveness, steps=100):
         aggressiveness=aggressiveness
     ))
 
-    for _ in range(steps):
-        tumor.step()
+    tumor.run(steps)
 
-    df = pd.DataFrame(tumor.history)
+    # tau_leap records one history row per leap, the counts are put back on every step
+    history = pd.DataFrame(tumor.history)
+    df = pd.DataFrame({"cancer_cell_count": np.interp(np.arange(1, steps + 1), history["step"], history["cancer_cell_count"])})
     df["TumorSize"] = df["cancer_cell_count"] / df["cancer_cell_count"].max()  # normalize
     df["Day"] = np.linspace(0, 1, len(df))  # normalized time
     return df[["Day", "TumorSize"]]
@@ -7,7 +7,7 @@ import sys
 
 # Import TumorSimV8 module
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from TumorSimV8 import Environment, Tumor, Cancer_Cell
+from TumorSimV8 import ArrayEnvironment, Tumor, HistoryObserver, Cancer_Cell
 
 # --- Step 1: Load real tumor growth data ---
 real_df = pd.read_excel("tumorgrowth.xlsx", sheet_name="AnalysisData")
@@ -18,9 +18,10 @@ real_df["Source"] = "Real Data"
 
 # --- Step 2: Run calibrated simulation ---
 def run_calibrated_simulation(mutation_rate, proliferation_chance, aggressiveness, steps=100):
-    env = Environment(width=20, height=20)
+    env = ArrayEnvironment(width=20, height=20)
     env.initialize_grid()
     tumor = Tumor(env)
+    tumor.add_observer(HistoryObserver())
     tumor.seed_initial_cancer(Cancer_Cell(
         position=(10, 10),
         mutation_rate=mutation_rate,
@@ -121,3 +121,699 @@ def test_is_valid_position():
     assert env.is_valid_position(2, 2) is True
     assert env.is_valid_position(-1, 0) is False
     assert env.is_valid_position(0, 5) is False
+
+
+# --- TumorSimV8 ---
+import os
+import random
+import subprocess
+import sys
+import numpy as np
+import TumorSimV8 as v8
+
+# grows a tumor from one founder cell in the middle of env for steps steps, with the random module seeded with
+# random_seed and history recorded unless history=False. Other keyword arguments go to Tumor (engine, seed, ...)
+def run_v8(env, steps=20, random_seed=1, mutation_rate=0.01, proliferation_chance=0.3, history=True, **tumor_args):
+    random.seed(random_seed)
+    if type(env) is v8.Environment:
+        env.initialize_grid() # the list backend starts without a grid
+    tumor = v8.Tumor(env, **tumor_args)
+    if history:
+        tumor.add_observer(v8.HistoryObserver())
+    tumor.seed_initial_cancer(v8.Cancer_Cell(position=env.center(), mutation_rate=mutation_rate,
+                                             proliferation_chance=proliferation_chance))
+    for _ in range(steps):
+        tumor.step()
+    return tumor
+
+def test_array_environment_grid_access():
+    env = v8.ArrayEnvironment(10, 10)
+    env.initialize_grid()
+    assert len(env.grid) == 10
+    assert len(env.grid[0]) == 10
+    assert env.grid[5][5].cell_type == 'normal'
+    assert env.grid[5][5].position == (5, 5)
+    assert env.occupancy.dtype == np.uint8
+    assert env.cell_index.dtype == np.int32
+
+    cell = v8.Cancer_Cell(position=(3, 4))
+    assert env.place_cell(cell, 3, 4)
+    assert env.is_occupied(3, 4) is True
+    assert env.grid[4][3] is cell
+    assert env.place_cell(v8.Cancer_Cell(position=(3, 4)), 3, 4) is False
+    assert len(env.get_neighbors(0, 0)) == 3
+    assert sum(n.cell_type == 'cancer' for n in env.get_neighbors(4, 4)) == 1
+
+def test_array_environment_rejects_sites_beyond_the_border():
+    env = v8.ArrayEnvironment(10, 8)
+    assert env.is_occupied(-1, 3) and env.is_occupied(10, 3) and env.is_occupied(4, 8) # border
+    assert env.place_cell(v8.Cancer_Cell(position=(10, 3)), 10, 3) is False
+    for site in [(-2, 3), (11, 3), (4, 9), (4, -2)]:
+        with pytest.raises(IndexError):
+            env.is_occupied(*site)
+    with pytest.raises(IndexError):
+        v8.ArrayEnvironment3D(4, 4, 4).get_cell(1, 1, 6)
+
+def test_array_backend_matches_list_backend():
+    reference = run_v8(v8.Environment(15, 15))
+    array = run_v8(v8.ArrayEnvironment(15, 15))
+    assert array.history == reference.history
+    assert np.array_equal(array.get_mutation_count_grid(), reference.get_mutation_count_grid())
+
+def test_array_environment_materializes_normal_cells_lazily():
+    env = v8.ArrayEnvironment(1000, 1000)
+    assert len(env.normal_cells) == 0
+    corner = env.grid[0][0]
+    assert env.grid[0][0] is corner
+    corner.age = 3
+    assert env.get_neighbors(1, 1)[-1].age == 3
+
+    env.place_cell(v8.Cancer_Cell(position=(0, 0)), 0, 0)
+    assert env.grid[0][0].cell_type == 'cancer'
+    assert (0, 0) not in env.normal_cells
+
+    del corner
+    env.get_neighbors(500, 500)
+    assert len(env.normal_cells) == 0
+
+def test_cell_store_views_write_through_and_grow():
+    store = v8.CellStore(capacity=2)
+    founder = store.append(v8.Cancer_Cell(position=(1, 1), proliferation_chance=0.5))
+    assert founder._store is store
+    founder.mutations = {"TP53"}
+    for i in range(5):
+        store.append_clone(founder, (i, 2))
+    assert len(store) == 6
+    assert store.capacity == 8
+    assert store.traits(slice(0, 6))[:, v8.TRAIT_INDEX['proliferation_chance']].tolist() == [0.5] * 6
+
+    daughter = store[-1]
+    assert daughter.position == (4, 2)
+    assert daughter.mutations == {"TP53"}
+    daughter.age = 7
+    assert store.age[5] == 7
+    assert store[5].age == 7
+
+    clone = daughter.clone((9, 9))
+    assert clone._store is store and clone._index == 6
+    assert clone.mutations == {"TP53"} and clone.age == 0
+    assert len(store) == 7
+
+def test_ages_are_derived_from_birth_steps():
+    tumor = run_v8(v8.ArrayEnvironment(20, 20), steps=10, random_seed=4, proliferation_chance=0.9, engine='vectorized')
+    newcomer = v8.Cancer_Cell(position=(0, 0))
+    newcomer.age = 3
+    tumor.cells.append(newcomer)
+    assert newcomer.age == 3 # moving to another store keeps the age
+
+    tumor.step()
+    count = len(tumor.cells)
+    assert newcomer.age == 4 and tumor.cells[0].age == 11
+    assert np.array_equal(tumor.cells.age[:count], tumor.iteration_count - tumor.cells.birth[:count])
+
+@pytest.mark.parametrize("engine", ["reference", "vectorized", "tau_leap"])
+def test_genotype_registry_tracks_clone_sizes(engine):
+    tumor = run_v8(v8.ArrayEnvironment(30, 30), steps=15, random_seed=6, mutation_rate=0.1, proliferation_chance=0.8,
+                   engine=engine)
+
+    registry = tumor.cells.genotypes
+    count = len(tumor.cells)
+    genotypes, counts = np.unique(tumor.cells.genotype[:count], return_counts=True)
+    assert dict(zip(*registry.clone_sizes())) == dict(zip(genotypes.tolist(), counts.tolist()))
+    assert len(registry.founders) == 1 and len(genotypes) > 1 # one founder, many mutant clones
+    assert list(registry.clone_sizes()[1]) == sorted(counts, reverse=True)
+
+    cell = max(tumor.cells, key=lambda cell: cell.mutation_count)
+    founder, mutations = registry.describe(int(tumor.cells.genotype[cell._index]))
+    assert founder['mutation_rate'] == 0.1 and mutations == cell.mutations
+    assert cell.proliferation_chance == tumor.cells.traits([cell._index])[0, v8.TRAIT_INDEX['proliferation_chance']]
+
+def test_tumor_cells_are_store_backed():
+    env = v8.ArrayEnvironment(10, 10)
+    tumor = v8.Tumor(env).seed_initial_cancer()
+    tumor.cells[0].proliferation_chance = 1.0
+    assert tumor.divide_cell(tumor.cells[0])
+    assert isinstance(tumor.cells, v8.CellStore)
+    assert tumor.cells[1].proliferation_chance == 1.0
+    assert [cell.position for cell in tumor.cells][0] == (5, 5)
+
+def test_vectorized_engine_keeps_grid_and_store_consistent():
+    env = v8.ArrayEnvironment(30, 30)
+    tumor = run_v8(env, steps=25, random_seed=5, mutation_rate=0.2, proliferation_chance=0.8, engine='vectorized')
+
+    count = len(tumor.cells)
+    assert count > 1
+    assert int(env.occupancy.sum()) == count
+    ys, xs = np.nonzero(env.occupancy)
+    rows = env.cell_index[ys, xs]
+    assert sorted(rows.tolist()) == list(range(count))
+    assert np.array_equal(tumor.cells.position[rows], np.column_stack((xs, ys)))
+    assert v8.popcount(tumor.cells.mutations[:count]).max() > 0
+    assert set(tumor.history[-1]) == {'step', 'cancer_cell_count', 'average_age', 'average_mutations'}
+    assert tumor.history[-1]['cancer_cell_count'] == count
+    assert tumor.cells[count - 1].age == tumor.cells.age[count - 1]
+
+def test_vectorized_engine_needs_array_environment():
+    with pytest.raises(ValueError):
+        v8.Tumor(v8.Environment(5, 5), engine='vectorized')
+
+def test_neighbor_count_field_is_maintained_on_placement():
+    env = v8.ArrayEnvironment(6, 5)
+    reference = v8.Environment(6, 5)
+    reference.initialize_grid()
+    rng = random.Random(2)
+    for _ in range(20):
+        x, y = rng.randrange(6), rng.randrange(5)
+        cell = v8.Cancer_Cell((x, y)) if rng.random() < 0.7 else v8.Cell((x, y))
+        env.grid[y][x] = cell
+        reference.grid[y][x] = cell
+    for y in range(5):
+        for x in range(6):
+            assert env.cancer_neighbor_count(x, y) == reference.cancer_neighbor_count(x, y)
+            assert env.local_pressure(x, y) == reference.local_pressure(x, y)
+    assert env.valid_neighbor_count(0, 0) == 3
+    assert env.valid_neighbor_count(0, 2) == 5
+    assert env.valid_neighbor_count(3, 2) == 8
+
+def frontier_by_scan(tumor):
+    env = tumor.environment
+    return {cell._index for cell in tumor.cells if not env.is_saturated(*cell.position)}
+
+@pytest.mark.parametrize("engine", ["reference", "vectorized"])
+def test_frontier_tracks_cells_with_free_neighbors(engine):
+    tumor = run_v8(v8.ArrayEnvironment(12, 12), steps=0, random_seed=4, proliferation_chance=0.9, engine=engine)
+    for _ in range(15):
+        tumor.step()
+        assert tumor.frontier == frontier_by_scan(tumor)
+    assert len(tumor.frontier) < len(tumor.cells)
+
+def test_place_clones_keeps_grid_frontier_and_metrics_consistent():
+    env = v8.ArrayEnvironment(12, 12)
+    tumor = v8.Tumor(env).seed_initial_cancer()
+    tumor.cells[0].mutations = {"TP53", "KRAS"}
+    tumor.refresh_metrics()
+    ys, xs = np.divmod(np.arange(30), 12)
+    rows = tumor.place_clones(np.zeros(xs.size, dtype=np.int64), np.column_stack((xs, ys)))
+    assert rows.tolist() == list(range(1, 31))
+    assert int(env.occupancy.sum()) == len(tumor.cells) == 31
+    assert env.cell_index[2, 5] == 30 and tumor.cells[30].mutations == {"TP53", "KRAS"}
+    assert tumor.frontier == frontier_by_scan(tumor)
+    values = {name: metric.value(tumor) for name, metric in tumor.metrics.items()}
+    tumor.refresh_metrics()
+    assert values == {name: metric.value(tumor) for name, metric in tumor.metrics.items()}
+
+def test_interior_cells_skip_division(monkeypatch):
+    env = v8.ArrayEnvironment(3, 3)
+    tumor = v8.Tumor(env).seed_initial_cancer()
+    for y in range(3):
+        for x in range(3):
+            if (x, y) != (1, 1):
+                env.place_cell(tumor.cells.append(v8.Cancer_Cell(position=(x, y))), x, y)
+                tumor.update_frontier(x, y)
+    assert tumor.frontier == set()
+    monkeypatch.setattr(v8.Cancer_Cell, 'should_divide', lambda *args: pytest.fail("interior cell drew a division"))
+    tumor.step()
+    assert tumor.iteration_count == 1
+
+def test_mutations_are_a_bitmask():
+    cell = v8.Cancer_Cell(position=(0, 0))
+    cell.mutations = {"TP53", "KRAS"}
+    assert cell._store.mutations[0] == v8.MUTATION_BITS["TP53"] | v8.MUTATION_BITS["KRAS"]
+    assert cell.mutation_count == 2
+    assert isinstance(cell.mutations, frozenset)
+    with pytest.raises(AttributeError):
+        cell.mutations.add("EGFR")
+
+    cell.mutation_rate = 1.0
+    cell.aggressiveness = 1.0
+    while cell.mutate():
+        pass
+    assert cell.mutations == set(v8.MUTATION_TYPES)
+    assert cell.mutation_count == len(v8.MUTATION_TYPES)
+    assert v8.popcount(np.array([0, 1, 0b1011, v8.ALL_MUTATIONS_MASK])).tolist() == [0, 1, 3, 17]
+
+def test_traits_follow_genotype_through_trait_table():
+    cell = v8.Cancer_Cell(position=(0, 0), mutation_rate=1.0, aggressiveness=1.0)
+    before = {trait: getattr(cell, trait) for trait in v8.TRAIT_COLUMNS}
+    assert cell.mutate()
+    (gene,) = cell.mutations
+    for trait in v8.TRAIT_COLUMNS:
+        expected = before[trait] + v8.MUTATION_EFFECTS[gene].get(trait, 0.0)
+        assert getattr(cell, trait) == pytest.approx(expected)
+
+    table = v8.genotype_trait_table()
+    mask = v8.MUTATION_BITS["PTEN"] | v8.MUTATION_BITS["SMAD4"] | v8.MUTATION_BITS["TP53"]
+    assert table[mask].tolist() == pytest.approx([0.04, 0.0, 0.0, 0.0, -0.4])
+
+    cell.pressure_sensitivity = 0.3
+    cell.mutations = cell.mutations | {"PTEN", "SMAD4"}
+    assert cell.pressure_sensitivity == pytest.approx(0.3)
+
+def test_subtypes_are_computed_on_demand_and_shared():
+    cell = v8.Cancer_Cell(position=(0, 0))
+    assert cell.subtype == ("Unclassified",)
+    cell.proliferation_chance = 0.6
+    cell.pressure_sensitivity = 0.9
+    assert cell.subtype == ("Proliferative", "Insensitive")
+    assert cell.clone((1, 1)).subtype is cell.subtype
+
+def test_subtype_grid_matches_per_cell_classification():
+    env = v8.ArrayEnvironment(20, 20)
+    tumor = run_v8(env, steps=15, random_seed=8, mutation_rate=0.3, proliferation_chance=0.7, engine='vectorized')
+    grid = tumor.get_subtype_grid()
+    assert grid[env.occupancy == 0].max() == 0
+    for cell in tumor.cells:
+        x, y = cell.position
+        assert grid[y, x] == v8.SUBTYPE_COLORS[cell.subtype[0]]
+    assert grid[env.occupancy == 1].min() > 0
+
+@pytest.mark.parametrize("engine", ["reference", "vectorized"])
+def test_running_aggregates_match_a_full_scan(engine):
+    tumor = run_v8(v8.ArrayEnvironment(15, 15), steps=0, random_seed=9, mutation_rate=0.1, proliferation_chance=0.6,
+                   engine=engine)
+    for _ in range(20):
+        tumor.step()
+        cells = list(tumor.cells)
+        row = tumor.history[-1]
+        assert row['cancer_cell_count'] == len(cells)
+        assert row['average_age'] == sum(cell.age for cell in cells) / len(cells)
+        assert row['average_mutations'] == sum(cell.mutation_count for cell in cells) / len(cells)
+
+def test_registered_metric_appears_in_history():
+    class DivisionsMetric(v8.StepMetric):
+        name = 'divisions'
+        def reset(self, tumor):
+            self.total = 0
+        def on_cells_added(self, tumor, rows):
+            self.total += len(rows)
+        def value(self, tumor):
+            return self.total
+
+    tumor = run_v8(v8.ArrayEnvironment(10, 10), steps=0, random_seed=2)
+    tumor.register_metric(DivisionsMetric())
+    for _ in range(10):
+        tumor.step()
+    assert list(tumor.history[-1]) == ['step', 'cancer_cell_count', 'average_age', 'average_mutations', 'divisions']
+    assert tumor.history[-1]['divisions'] == len(tumor.cells) - 1
+
+@pytest.mark.parametrize("engine", ["reference", "vectorized"])
+def test_observers_fire_at_their_cadence(engine):
+    class Recorder():
+        def __init__(self):
+            self.events = []
+        def on_step_end(self, tumor):
+            self.events.append(('end', tumor.iteration_count))
+        def on_snapshot(self, tumor, grid):
+            self.events.append(('snapshot', tumor.iteration_count))
+            assert np.array_equal(grid, tumor.get_mutation_count_grid())
+        def on_division(self, tumor, parent, daughter):
+            self.events.append(('division', tumor.iteration_count))
+            assert max(abs(a - b) for a, b in zip(daughter.position, parent.position)) == 1
+        def on_mutation(self, tumor, cell):
+            self.events.append(('mutation', tumor.iteration_count))
+
+    tumor = run_v8(v8.ArrayEnvironment(20, 20), steps=0, random_seed=4, mutation_rate=0.2, proliferation_chance=0.8,
+                   history=False, engine=engine)
+    recorder = tumor.add_observer(Recorder(), on_step_end=3, on_snapshot=5)
+    for _ in range(12):
+        tumor.step()
+
+    assert [step for event, step in recorder.events if event == 'end'] == [3, 6, 9, 12]
+    assert [step for event, step in recorder.events if event == 'snapshot'] == [5, 10]
+    assert sum(event == 'division' for event, _ in recorder.events) == len(tumor.cells) - 1
+    assert sum(event == 'mutation' for event, _ in recorder.events) > 0
+    assert tumor.history == [] and tumor.mutation_frames == []
+
+    tumor.remove_observer(recorder)
+    recorder.events.clear()
+    tumor.step()
+    assert recorder.events == []
+
+def test_add_observer_rejects_unknown_events():
+    with pytest.raises(ValueError):
+        v8.Tumor(v8.ArrayEnvironment(5, 5)).add_observer(v8.HistoryObserver(), on_step=2)
+
+@pytest.mark.parametrize("every", [0, -3])
+def test_add_observer_rejects_cadences_below_one(every):
+    tumor = v8.Tumor(v8.ArrayEnvironment(5, 5))
+    with pytest.raises(ValueError):
+        tumor.add_observer(v8.HistoryObserver(), on_step_end=every)
+    assert tumor.observers['on_step_end'] == []
+
+@pytest.mark.parametrize("backend", [v8.Environment, v8.ArrayEnvironment])
+def test_gillespie_engine_reports_history_at_integer_times(backend):
+    env = backend(25, 25)
+    tumor = run_v8(env, steps=15, random_seed=6, mutation_rate=0.1, proliferation_chance=0.6, engine='gillespie')
+
+    assert [row['step'] for row in tumor.history] == list(range(1, 16))
+    assert tumor.time == 15.0
+    assert all(time >= 15.0 for time, _, _ in tumor.event_queue)
+    counts = [row['cancer_cell_count'] for row in tumor.history]
+    assert counts == sorted(counts) and counts[-1] == len(tumor.cells) > 1
+    for cell in tumor.cells:
+        assert env.grid[cell.position[1]][cell.position[0]] is cell
+    assert tumor.frontier == frontier_by_scan(tumor)
+    assert tumor.history[-1]['average_age'] == sum(cell.age for cell in tumor.cells) / len(tumor.cells)
+
+def test_gillespie_engine_only_draws_for_cells_with_events():
+    tumor = run_v8(v8.ArrayEnvironment(9, 9), steps=5, random_seed=3, mutation_rate=0.0, proliferation_chance=0.0,
+                   engine='gillespie')
+    assert tumor.event_queue == []
+    assert tumor.cells[0].age == 5
+
+def test_tau_leap_with_single_steps_matches_vectorized_engine():
+    results = []
+    for engine in ('vectorized', 'tau_leap'):
+        tumor = run_v8(v8.ArrayEnvironment(40, 40), steps=30, random_seed=8, mutation_rate=0.05,
+                       proliferation_chance=0.6, engine=engine, max_leap=1)
+        count = len(tumor.cells)
+        results.append((tumor.cells.position[:count].copy(), tumor.cells.mutations[:count].copy()))
+    assert np.array_equal(results[0][0], results[1][0])
+    assert np.array_equal(results[0][1], results[1][1])
+
+def test_tau_leap_keeps_tumor_consistent_across_leaps():
+    env = v8.ArrayEnvironment(60, 60)
+    tumor = run_v8(env, steps=0, random_seed=2, mutation_rate=0.05, proliferation_chance=0.6, engine='tau_leap',
+                   tau_epsilon=1.0, max_leap=5)
+    tumor.add_observer(v8.SnapshotObserver())
+    while tumor.iteration_count < 40:
+        tumor.step()
+
+    steps = [row['step'] for row in tumor.history]
+    assert steps[-1] == tumor.iteration_count and len(steps) < tumor.iteration_count
+    assert len(tumor.mutation_frames) == tumor.iteration_count // v8.ANIMATION_INTERVAL
+    count = len(tumor.cells)
+    assert int(env.occupancy.sum()) == count
+    assert tumor.frontier == frontier_by_scan(tumor)
+    assert tumor.history[-1]['average_age'] == tumor.cells.age[:count].mean()
+    assert tumor.history[-1]['average_mutations'] == v8.popcount(tumor.cells.mutations[:count]).mean() > 0
+
+def test_tau_leap_run_stops_at_the_requested_step():
+    tumor = run_v8(v8.ArrayEnvironment(40, 40), steps=0, random_seed=5, proliferation_chance=0.6, engine='tau_leap',
+                   tau_epsilon=1.0, max_leap=10)
+    tumor.run(25)
+    assert tumor.iteration_count == 25 and tumor.history[-1]['step'] == 25
+    assert len(tumor.history) < 25 # one row per leap
+    assert tumor.run(3).iteration_count == 28
+
+    # epsilon bounds the leap: no cell expects more than tau_epsilon mutations in one
+    leaps = []
+    for epsilon in (0.05, 0.2):
+        tumor.tau_epsilon = epsilon
+        steps, chance = tumor.plan_leap()
+        assert steps * chance.max() <= epsilon
+        leaps.append(steps)
+    assert 1 < leaps[0] < leaps[1] < tumor.max_leap
+    assert tumor.plan_leap(max_steps=1)[0] == 1
+
+def test_leap_events_spread_group_counts_over_steps():
+    rng = np.random.default_rng(0)
+    chances = np.r_[np.full(2000, 0.02), np.full(1000, 0.1), np.zeros(500)]
+    rows, offsets = v8.leap_events(v8.chance_groups(chances), 10, rng)
+    assert np.all(np.diff(offsets) >= 0) and offsets.max() < 10
+    assert len(set(zip(rows.tolist(), offsets.tolist()))) == rows.size
+    per_row = np.bincount(rows, minlength=chances.size)
+    assert per_row[3000:].sum() == 0
+    assert abs(per_row[:2000].mean() - 0.2) < 0.05 and abs(per_row[2000:3000].mean() - 1.0) < 0.15
+
+def test_tau_leap_arguments_are_checked():
+    with pytest.raises(ValueError):
+        v8.Tumor(v8.Environment(5, 5), engine='tau_leap')
+    with pytest.raises(ValueError):
+        v8.Tumor(v8.ArrayEnvironment(5, 5), engine='tau_leap', tau_epsilon=0)
+
+@pytest.mark.parametrize("engine", ["reference", "vectorized", "tau_leap"])
+def test_saturated_tumor_only_ages_and_mutates(engine, monkeypatch):
+    tumor = run_v8(v8.ArrayEnvironment(20, 20), steps=0, random_seed=3, mutation_rate=0.05, proliferation_chance=0.9,
+                   engine=engine)
+    while not tumor.is_saturated():
+        tumor.step()
+    count, start = len(tumor.cells), tumor.iteration_count
+    mutations = v8.popcount(tumor.cells.mutations[:count]).sum()
+
+    def fail():
+        raise AssertionError("a saturated tumor took a full step")
+    monkeypatch.setattr(tumor, 'step_' + engine, fail)
+    for _ in range(60):
+        tumor.step()
+
+    assert len(tumor.cells) == count
+    assert [row['step'] for row in tumor.history[-60:]] == list(range(start + 1, start + 61))
+    assert tumor.history[-1]['average_age'] == tumor.cells.age[:count].mean()
+    assert tumor.history[-1]['average_mutations'] == v8.popcount(tumor.cells.mutations[:count]).mean()
+    assert v8.popcount(tumor.cells.mutations[:count]).sum() > mutations
+
+def test_geometric_waits_match_per_step_chances():
+    uniforms = (np.arange(100000) + 0.5) / 100000
+    for chance in (0.01, 0.3, 1.0):
+        waits = v8.geometric_waits(np.full(uniforms.size, chance), uniforms)
+        assert waits.min() == 1
+        for steps in range(5): # no success in the first steps steps
+            assert abs(np.mean(waits > steps) - (1 - chance) ** steps) < 1e-4
+    assert np.isinf(v8.geometric_waits(np.zeros(1), np.array([0.5]))).all()
+
+def test_scheduled_mutations_match_per_step_draws_in_distribution():
+    def mutation_count_frequencies(scheduled, seed):
+        tumor = run_v8(v8.ArrayEnvironment(200, 200), steps=0, mutation_rate=0.02, proliferation_chance=0.0,
+                       history=False, engine='vectorized', seed=seed, scheduled_mutations=scheduled)
+        ys, xs = np.divmod(np.arange(4000), 200)
+        tumor.place_clones(np.zeros(xs.size, dtype=np.int64), np.column_stack((xs, ys)))
+        for _ in range(50):
+            tumor.step()
+        counts = v8.popcount(tumor.cells.mutations[:len(tumor.cells)])
+        return np.bincount(counts, minlength=len(v8.MUTATION_TYPES) + 1) / counts.size
+
+    per_step = mutation_count_frequencies(False, 1)
+    scheduled = mutation_count_frequencies(True, 2)
+    assert per_step[0] < 0.5 and per_step[1:].sum() > 0.5
+    assert 0.5 * np.abs(per_step - scheduled).sum() < 0.03 # total variation distance
+
+@pytest.mark.parametrize("engine", ["reference", "vectorized"])
+def test_scheduled_mutations_keep_tumor_consistent(engine):
+    tumor = run_v8(v8.ArrayEnvironment(40, 40), steps=30, random_seed=5, mutation_rate=0.1, proliferation_chance=0.6,
+                   engine=engine, scheduled_mutations=True)
+    count = len(tumor.cells)
+    assert count > 50
+    assert tumor.frontier == frontier_by_scan(tumor)
+    assert tumor.history[-1]['average_mutations'] == v8.popcount(tumor.cells.mutations[:count]).mean() > 0
+    with pytest.raises(ValueError):
+        v8.Tumor(v8.ArrayEnvironment(5, 5), engine='gillespie', scheduled_mutations=True)
+
+def test_counter_streams_agree_between_scalar_and_array_draws():
+    positions = np.array([[3, 4], [-2, 7], [0, 0]])
+    draws = v8.counter_uniforms(99, 5, v8.site_keys(positions)[:, None], v8.DRAW_SITE, np.arange(8))
+    expected = [[v8.counter_uniform(99, 5, v8.site_key(x, y), v8.DRAW_SITE, i) for i in range(8)] for x, y in positions.tolist()]
+    assert np.array_equal(draws, expected)
+    assert 0 <= draws.min() and draws.max() < 1
+    assert v8.counter_uniform(99, 5, 1, v8.DRAW_SITE) != v8.counter_uniform(99, 6, 1, v8.DRAW_SITE)
+
+@pytest.mark.parametrize("engine", ["reference", "vectorized"])
+def test_seeded_trajectory_does_not_depend_on_row_order_or_global_state(engine):
+    def run(global_seed, inert_first):
+        random.seed(global_seed)
+        env = v8.ArrayEnvironment(30, 30)
+        tumor = v8.Tumor(env, engine=engine, seed=11)
+        inert = v8.Cancer_Cell(position=(1, 1), mutation_rate=0.0, proliferation_chance=0.0)
+        founder = v8.Cancer_Cell(position=(15, 15), mutation_rate=0.1, proliferation_chance=0.7)
+        for cell in ((inert, founder) if inert_first else (founder, inert)):
+            tumor.cells.append(cell)
+            env.place_cell(cell, *cell.position)
+            tumor.update_frontier(*cell.position)
+        tumor.refresh_metrics()
+        for _ in range(20):
+            tumor.step()
+        return {(cell.position, cell.mutations, cell.age) for cell in tumor.cells}
+
+    first = run(1, inert_first=False)
+    assert len(first) > 20
+    assert run(2, inert_first=True) == first
+
+def test_gap_ties_are_settled_by_the_cells_own_draws():
+    chosen_gaps = set()
+    for seed in range(40):
+        env = v8.ArrayEnvironment(7, 7)
+        tumor = v8.Tumor(env, seed=seed).seed_initial_cancer(
+            v8.Cancer_Cell(position=(3, 3), mutation_rate=0.0, proliferation_chance=1.0))
+        for x in (2, 4): # leaves (3, 2) and (3, 4) as equally good gaps
+            cell = v8.Cancer_Cell(position=(x, 3), mutation_rate=0.0, proliferation_chance=0.0)
+            tumor.cells.append(cell)
+            env.place_cell(cell, x, 3)
+        parent = env.get_cell(3, 3)
+
+        candidates = np.array([3, 3]) + v8.NEIGHBOR_OFFSETS
+        index = env.site_index(candidates)
+        site_draws = np.array([parent.uniform(v8.DRAW_SITE, i) for i in range(len(candidates))])
+        prefer_gap = parent.uniform(v8.DRAW_GAP) < 0.8
+        choice = v8.choose_division_sites(env.occupancy[index][None] == 0, env.neighbor_count[index][None],
+                                          site_draws[None], np.array([prefer_gap]))[0]
+        assert tumor.divide_cell(parent)
+        assert env.is_occupied(*candidates[choice].tolist())
+        if prefer_gap:
+            chosen_gaps.add(tuple(candidates[choice].tolist()))
+    assert chosen_gaps == {(3, 2), (3, 4)}
+
+@pytest.mark.parametrize("backend", [v8.ArrayEnvironment, v8.Environment])
+def test_free_directions_keep_the_best_gaps(backend):
+    random.seed(7)
+    env = backend(6, 6)
+    env.initialize_grid()
+    for x, y in random.sample([(x, y) for x in range(6) for y in range(6)], 15):
+        env.place_cell(v8.Cancer_Cell(position=(x, y)), x, y)
+
+    for x in range(6):
+        for y in range(6):
+            free = [direction for direction, (dx, dy) in enumerate(v8.NEIGHBOR_OFFSETS.tolist())
+                    if env.is_valid_position(x + dx, y + dy) and not env.is_occupied(x + dx, y + dy)]
+            assert list(env.free_directions((x, y))) == free
+            gaps = [env.cancer_neighbor_count(*env.neighbor_site((x, y), direction)) for direction in free]
+            best = [direction for direction, gap in zip(free, gaps) if gap == max(gaps)]
+            assert list(env.free_directions((x, y), best_gaps=True)) == best
+    # cells are slotted, neither normal tissue nor cell views carry a __dict__
+    assert not hasattr(env.get_cell(0, 0), '__dict__')
+    assert not hasattr(v8.Cancer_Cell(position=(0, 0)), '__dict__')
+
+def test_counter_streams_need_a_seedable_engine():
+    with pytest.raises(ValueError):
+        v8.Tumor(v8.ArrayEnvironment(5, 5), engine='gillespie', seed=1)
+
+def test_parallel_engine_matches_vectorized_engine_bit_for_bit():
+    results = []
+    for engine, environment in (('vectorized', v8.ArrayEnvironment(50, 40)), ('parallel', v8.SharedArrayEnvironment(50, 40))):
+        tumor = run_v8(environment, steps=45, mutation_rate=0.05, proliferation_chance=0.6, engine=engine, seed=11,
+                       workers=2)
+        tumor.close()
+        count = len(tumor.cells)
+        results.append((tumor.cells.position[:count].copy(), tumor.cells.mutations[:count].copy(),
+                        tumor.cells.age[:count].copy(), tumor.history))
+    assert len(results[1][0]) > 64 # the store grew into new shared blocks on the way
+    for vectorized, parallel in zip(*results):
+        assert np.array_equal(vectorized, parallel)
+    assert tumor.frontier == frontier_by_scan(tumor)
+
+# forked workers inherit the first tumor's environment, which is only left to the cycle collector. The parent keeps
+# the collector off until both runs are done while the workers collect right away: the workers must not unlink the
+# coordinator's shared memory blocks, or releasing them in the parent fails
+TWO_PARALLEL_TUMORS = """
+import gc
+import os
+import TumorSimV8 as v8
+
+def run():
+    tumor = v8.Tumor(v8.SharedArrayEnvironment(40, 40), engine='parallel', seed=1, workers=2).seed_initial_cancer()
+    for _ in range(5):
+        tumor.step()
+    tumor.close()
+    tumor.cycle = tumor
+    return len(tumor.cells)
+
+gc.disable()
+gc.set_threshold(1)
+os.register_at_fork(after_in_child=gc.enable)
+first = run()
+second = run()
+gc.enable()
+gc.collect()
+print(first, second)
+"""
+
+def test_parallel_tumors_run_one_after_another():
+    result = subprocess.run([sys.executable, "-c", TWO_PARALLEL_TUMORS], capture_output=True, text=True, timeout=300,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    first, second = result.stdout.split()
+    assert first == second
+    assert "psm_" not in result.stderr and "Error" not in result.stderr
+
+@pytest.mark.parametrize("backend", [v8.ArrayEnvironment, v8.Environment])
+def test_synchronous_reference_engine_matches_vectorized_engine_bit_for_bit(backend):
+    results = []
+    for engine, environment, synchronous in (('vectorized', v8.ArrayEnvironment(50, 40), False),
+                                             ('reference', backend(50, 40), True)):
+        tumor = run_v8(environment, steps=40, mutation_rate=0.05, proliferation_chance=0.6, engine=engine, seed=7,
+                       synchronous=synchronous)
+        count = len(tumor.cells)
+        results.append((tumor.cells.position[:count].copy(), tumor.cells.mutations[:count].copy(),
+                        tumor.cells.birth[:count].copy(), tumor.history))
+    assert len(results[0][0]) > 100
+    for vectorized, synchronous in zip(*results):
+        assert np.array_equal(vectorized, synchronous)
+    with pytest.raises(ValueError):
+        v8.Tumor(v8.ArrayEnvironment(5, 5), engine='vectorized', synchronous=True)
+
+def test_parallel_engine_arguments_are_checked():
+    with pytest.raises(ValueError):
+        v8.Tumor(v8.ArrayEnvironment(5, 5), engine='parallel')
+    with pytest.raises(ValueError):
+        v8.Tumor(v8.SharedArrayEnvironment(5, 5), engine='parallel', workers=0)
+    assert v8.Tumor(v8.SharedArrayEnvironment(5, 5), engine='parallel').seed is not None
+
+@pytest.mark.parametrize("engine", ["reference", "gillespie"])
+def test_sparse_environment_grows_without_edges(engine):
+    env = v8.SparseEnvironment(tile_size=8)
+    tumor = run_v8(env, steps=25, random_seed=6, mutation_rate=0.05, proliferation_chance=0.9, engine=engine)
+
+    count = len(tumor.cells)
+    positions = tumor.cells.position[:count]
+    x0, y0, x1, y1 = env.bounds()
+    assert (x0, y0) == tuple(positions.min(axis=0)) and (x1, y1) == tuple(positions.max(axis=0) + 1)
+    assert x0 < 0 and y0 < 0 # no wall at the origin
+    assert (env.width, env.height) == (x1 - x0, y1 - y0)
+    # only tiles holding the tumor or touching it exist
+    assert len(env.tiles) <= ((x1 - x0) // 8 + 3) * ((y1 - y0) // 8 + 3)
+    assert tumor.frontier == frontier_by_scan(tumor)
+    x, y = positions[0]
+    assert env.local_pressure(x, y) == env.cancer_neighbor_count(x, y) / 8
+
+    grid = env.mutation_count_grid()
+    assert grid.shape == (y1 - y0, x1 - x0)
+    assert np.array_equal(grid[positions[:, 1] - y0, positions[:, 0] - x0], v8.popcount(tumor.cells.mutations[:count]))
+    assert grid.sum() == v8.popcount(tumor.cells.mutations[:count]).sum()
+    window = env.subtype_grid((x0 - 2, y0, x0 + 3, y0 + 1))
+    assert window.shape == (1, 5) and not window[:, :2].any()
+
+def test_sparse_environment_rejects_array_engines():
+    with pytest.raises(ValueError):
+        v8.Tumor(v8.SparseEnvironment(), engine='vectorized')
+    with pytest.raises(ValueError):
+        v8.SparseEnvironment(tile_size=0)
+
+def test_3d_lattice_has_a_26_neighbor_moore_neighborhood():
+    env = v8.ArrayEnvironment3D(6, 5, 4)
+    assert env.shape == (4, 5, 6) and env.site_count() == 120
+    assert len(env.get_neighbors(2, 2, 2)) == 26 and env.valid_neighbor_count(2, 2, 2) == 26
+    assert len(env.get_neighbors(0, 0, 0)) == 7 and env.valid_neighbor_count(0, 0, 0) == 7
+    assert env.valid_neighbor_count(0, 2, 2) == 17
+    tumor = v8.Tumor(env).seed_initial_cancer()
+    assert tumor.cells[0].position == (3, 2, 2)
+    assert env.cancer_neighbor_count(2, 1, 1) == 1 and env.cancer_neighbor_count(1, 2, 2) == 0
+
+@pytest.mark.parametrize("engine", ["reference", "vectorized", "gillespie"])
+def test_3d_lattice_grows_a_spheroid(engine):
+    env = v8.ArrayEnvironment3D(16, 16, 16)
+    tumor = run_v8(env, steps=12, random_seed=12, mutation_rate=0.05, proliferation_chance=0.9, engine=engine)
+
+    count = len(tumor.cells)
+    positions = tumor.cells.position[:count]
+    assert np.ptp(positions, axis=0).min() > 0 # grew along every axis
+    assert int(env.occupancy.sum()) == count
+    assert np.array_equal(env.occupancy[positions[:, 2], positions[:, 1], positions[:, 0]], np.ones(count))
+    # neighbor counts agree with a brute force count over the 26 offsets
+    padded = np.pad(env.occupancy.astype(int), 1)
+    brute = sum(np.roll(padded, tuple(offset[::-1]), axis=(0, 1, 2)) for offset in v8.NEIGHBOR_OFFSETS_3D)[1:-1, 1:-1, 1:-1]
+    assert np.array_equal(brute, env.neighbor_count)
+    assert tumor.frontier == frontier_by_scan(tumor)
+
+    volume = np.zeros(env.shape, dtype=int)
+    volume[positions[:, 2], positions[:, 1], positions[:, 0]] = v8.popcount(tumor.cells.mutations[:count])
+    assert np.array_equal(tumor.get_mutation_count_grid(), volume.max(axis=0))
+    assert np.array_equal(env.mutation_count_grid(z=8), volume[8])
+    assert tumor.get_subtype_grid().shape == (16, 16)
+
+def test_3d_lattice_counter_streams_do_not_depend_on_row_order():
+    results = []
+    for engine in ('reference', 'vectorized'):
+        tumor = run_v8(v8.ArrayEnvironment3D(12, 12, 12), steps=1, mutation_rate=0.05, proliferation_chance=0.9,
+                       engine=engine, seed=4)
+        results.append(sorted(map(tuple, tumor.cells.position[:len(tumor.cells)].tolist())))
+    # a single cell divides the same way in both engines
+    assert results[0] == results[1]